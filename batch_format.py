@@ -0,0 +1,505 @@
+# batch_format.py
+"""批量格式化命令行工具
+
+遍历目录树，用进程池（默认每个 CPU 核心一个进程）并行格式化源文件，
+结果写回原文件或输出到另一个目录。
+
+指定 --git-ref 或 --staged 时只处理相对该提交或暂存区有改动的文件，加上 --changed-lines
+只修改改动过的行。--staged 检查的是暂存区中的内容，工作区还有未暂存改动的文件不会被写回。
+结果按内容哈希和设置指纹记录在 SQLite 缓存中，已经符合风格的文件下次直接跳过。
+语言按扩展名识别，也可以用 --language 指定。
+
+用法示例：
+    python batch_format.py src include --style standard
+    python batch_format.py src --output-dir formatted --jobs 8
+    python batch_format.py --git-ref origin/main --changed-lines
+    python batch_format.py --staged --check          # pre-commit 钩子
+    python batch_format.py scripts --language python
+"""
+import argparse
+import mmap
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import format_engine
+import git_changes
+import language_registry
+import parallel_format
+import spacing_rules
+from format_engine import load_settings
+from result_store import ResultStore, hash_bytes
+
+DEFAULT_EXTENSIONS = language_registry.extensions_for('c')
+# 遍历目录时跳过的目录
+SKIP_DIRS = frozenset(['.git', '.svn', '.hg', '__pycache__', 'build', 'dist'])
+# 超过此大小的文件用内存映射逐行处理，内存占用不随文件大小增长
+STREAM_THRESHOLD = 16 * 1024 * 1024
+# 只处理一个文件、不只检查且大小在此值与 STREAM_THRESHOLD 之间时，把文件切块后用进程池并行格式化
+# （需要把整个文件读入内存，更大的文件仍用内存映射）
+PARALLEL_THRESHOLD = 1024 * 1024
+
+# git 模式下缓存文件的默认名称，位于 .git 目录中
+CACHE_NAME = 'code_style_formatter_cache.sqlite'
+
+# 每个工作进程在初始化时保存一份设置，避免每个任务都重新传递
+_worker_settings = None
+# 只检查、不写回文件
+_worker_check = False
+
+
+def file_settings(settings, path):
+    """自动识别语言时按扩展名确定文件的语言，结果缓存的设置指纹因此区分语言"""
+    if settings.get('language', 'auto') != 'auto':
+        return settings
+    language = language_registry.language_for_filename(path)
+    if language is None:
+        # 扩展名未知，格式化时按文件开头的内容识别
+        return settings
+    return dict(settings, language=language)
+
+
+def collect_files(paths, extensions):
+    """收集需要格式化的文件，返回 (源文件, 相对路径) 列表
+
+    给出多个目录时，相对路径以目录名开头（src/a.h、include/a.h），输出到 --output-dir 时不会互相覆盖。
+    """
+    files = []
+    for path in paths:
+        if os.path.isfile(path):
+            files.append((path, os.path.basename(path)))
+            continue
+        prefix = _root_name(path) if len(paths) > 1 else ''
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS)
+            for filename in sorted(filenames):
+                if filename.lower().endswith(extensions):
+                    full_path = os.path.join(dirpath, filename)
+                    files.append((full_path, os.path.join(prefix, os.path.relpath(full_path, path))))
+    return files
+
+
+def collect_changed_files(paths, extensions, ref=None, staged=False):
+    """收集 git 中有改动、位于 paths 之下的文件，返回 (源文件, 相对路径) 列表
+
+    相对路径的规则与 collect_files 相同。
+    """
+    roots = [os.path.realpath(path) for path in paths]
+    files = []
+    for path in git_changes.changed_files(ref, staged):
+        path = os.path.realpath(path)
+        if not path.lower().endswith(extensions) or not os.path.isfile(path):
+            continue
+        for root in roots:
+            if path == root:
+                files.append((path, os.path.basename(path)))
+                break
+            if path.startswith(root.rstrip(os.sep) + os.sep):
+                prefix = _root_name(root) if len(roots) > 1 else ''
+                files.append((path, os.path.join(prefix, os.path.relpath(path, root))))
+                break
+    return files
+
+
+def _root_name(path):
+    return os.path.basename(os.path.normpath(os.path.abspath(path)))
+
+
+def output_collisions(files):
+    """返回输出到同一目录时会互相覆盖的文件：[(相对路径, [源文件, ...]), ...]"""
+    sources = {}
+    for source, relative in files:
+        entry = sources.setdefault(os.path.normcase(os.path.normpath(relative)), (relative, set()))
+        entry[1].add(os.path.realpath(source))
+    return [(relative, sorted(paths)) for relative, paths in sources.values() if len(paths) > 1]
+
+
+def read_source(path):
+    """读取源文件，换行符原样保留"""
+    with open(path, 'r', encoding='utf-8', errors='surrogateescape', newline='') as f:
+        return f.read()
+
+
+def write_source(path, text):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8', errors='surrogateescape', newline='') as f:
+        f.write(text)
+
+
+def write_binary(path, data):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def map_file(source, target=None):
+    """用内存映射格式化大文件，返回是否有改动
+
+    直接在映射上查找换行符逐行处理，不把整个文件读成字符串；没有改动的连续行从映射原样写出，
+    只有被改写的行才会分配新对象。结果先写入临时文件，再替换目标文件。
+    target 为 None 时只检查，遇到第一处改动就返回。
+    """
+    if os.path.getsize(source) == 0:
+        # 空文件无法映射，也没有需要格式化的内容
+        if target is not None and target != source:
+            write_binary(target, b'')
+        return False
+
+    settings = file_settings(_worker_settings, source)
+    temp_path = None if target is None else target + '.formatting'
+    out = None
+    changed = False
+    try:
+        with open(source, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            sample = mapped[:language_registry.SAMPLE_SIZE].decode('utf-8', 'replace')
+            formatter = format_engine.LineFormatter(
+                settings, language=format_engine.resolve_language(settings, sample))
+            view = memoryview(mapped)
+            try:
+                size = len(mapped)
+                pos = 0
+                # 已经写出或确认无需改动的位置
+                copied = 0
+                while pos < size:
+                    newline = mapped.find(b'\n', pos)
+                    if newline < 0:
+                        end = next_pos = size
+                    else:
+                        end, next_pos = newline, newline + 1
+                        if end > pos and mapped[end - 1] == 0x0d:
+                            end -= 1
+                    raw = mapped[pos:end]
+                    formatted = formatter.format_bytes_line(raw)
+                    if formatted is not raw:
+                        changed = True
+                        if target is None:
+                            return True
+                        if out is None:
+                            out = _open_temp(temp_path)
+                        out.write(view[copied:pos])
+                        out.write(formatted)
+                        copied = end
+                    pos = next_pos
+
+                if out is None and target is not None and target != source:
+                    out = _open_temp(temp_path)
+                if out is not None:
+                    out.write(view[copied:size])
+            finally:
+                view.release()
+
+        # 映射关闭后才能替换原文件
+        if out is not None:
+            out.close()
+            os.replace(temp_path, target)
+        return changed
+    finally:
+        if out is not None:
+            out.close()
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _open_temp(temp_path):
+    directory = os.path.dirname(temp_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return open(temp_path, 'wb')
+
+
+def _init_worker(settings, check=False):
+    global _worker_settings, _worker_check
+    _worker_settings = settings
+    _worker_check = check
+
+
+def _format_file(task):
+    """在工作进程中格式化单个文件
+
+    task 是 (源文件, 目标文件, 行范围, 内容)，行范围为 None 时处理整个文件；
+    内容为 None 时读取源文件，否则处理给出的字节（例如暂存区中的版本）。
+    返回 (源文件, 字节数, 是否修改, 整个文件是否已符合风格, 错误信息)。
+    """
+    source, target, line_ranges, data = task
+    settings = file_settings(_worker_settings, source)
+    try:
+        if data is None:
+            size = os.path.getsize(source)
+            if size >= STREAM_THRESHOLD and line_ranges is None:
+                changed = map_file(source, None if _worker_check else target)
+                return source, size, changed, not changed, None
+            with open(source, 'rb') as f:
+                data = f.read()
+        size = len(data)
+        if line_ranges is None:
+            # 整个文件按字节格式化，换行符原样保留
+            formatted = format_engine.format_bytes(data, settings)
+            changed = formatted != data
+            if not _worker_check and (changed or target != source):
+                write_binary(target, formatted)
+            return source, size, changed, not changed, None
+
+        text = data.decode('utf-8', 'surrogateescape')
+        edits = format_engine.format_edits(text, settings)
+        formatted = format_engine.apply_edits(text, _select_edits(text, edits, line_ranges))
+        changed = formatted != text
+        if not _worker_check and (changed or target != source):
+            write_source(target, formatted)
+        return source, size, changed, not edits, None
+    except Exception as e:
+        return source, 0, False, False, str(e)
+
+
+def _format_file_parallel(task, settings, jobs):
+    """在主进程中把单个大文件切块并行格式化并写回，返回值与 _format_file 相同"""
+    source, target, _, _ = task
+    try:
+        size = os.path.getsize(source)
+        text = read_source(source)
+        formatted = parallel_format.format_parallel(text, file_settings(settings, source), jobs)
+        changed = formatted != text
+        if changed or target != source:
+            write_source(target, formatted)
+        return source, size, changed, not changed, None
+    except Exception as e:
+        return source, 0, False, False, str(e)
+
+
+def _split_single_file(tasks, jobs, check):
+    """只有一个整文件任务且文件足够大时，值得在文件内部并行
+
+    只检查时逐行比较即可，不必生成整个结果；超过 STREAM_THRESHOLD 的文件用内存映射处理，不整个读入。
+    """
+    if jobs == 1 or check or len(tasks) != 1 or tasks[0][2] is not None or tasks[0][3] is not None:
+        return False
+    try:
+        return PARALLEL_THRESHOLD <= os.path.getsize(tasks[0][0]) < STREAM_THRESHOLD
+    except OSError:
+        return False
+
+
+def _select_edits(text, edits, line_ranges):
+    """只保留落在指定行范围内的改动；每个改动都在一行之内"""
+    selected = []
+    line = 1
+    pos = 0
+    for edit in edits:
+        line += text.count('\n', pos, edit[0])
+        pos = edit[0]
+        if any(start <= line <= end for start, end in line_ranges):
+            selected.append(edit)
+    return selected
+
+
+def run_batch(files, settings, output_dir=None, jobs=None, store=None, check=False,
+              line_ranges=None, contents=None):
+    """并行格式化文件列表，返回统计信息
+
+    store 是 ResultStore 时，缓存中已符合风格的文件直接跳过；check 为真时只检查不写回；
+    line_ranges 是 {绝对路径: [(起始行, 结束行), ...]}，给出时只修改这些行；
+    contents 是 {绝对路径: 字节}，其中的文件按给出的内容处理而不读取文件，缓存也按这些内容查找。
+    """
+    # 语言 -> 设置指纹；自动识别语言时不同语言的文件对应不同的指纹
+    fingerprints = {}
+    stats = {'files': 0, 'changed': 0, 'cached': 0, 'bytes': 0, 'errors': [], 'changed_files': []}
+    start = time.perf_counter()
+
+    tasks = []
+    hashes = {}
+
+    def fingerprint_of(source):
+        current = file_settings(settings, source)
+        language = current.get('language', 'auto')
+        if language not in fingerprints:
+            fingerprints[language] = format_engine.settings_fingerprint(current)
+        return fingerprints[language]
+
+    for source, relative in files:
+        target = os.path.join(output_dir, relative) if output_dir else source
+        ranges = line_ranges.get(os.path.realpath(source)) if line_ranges is not None else None
+        if line_ranges is not None and ranges == []:
+            # 只有删除行的文件
+            continue
+        data = contents.get(os.path.realpath(source)) if contents is not None else None
+        if store is not None and target == source:
+            try:
+                if data is not None:
+                    content_hash = hash_bytes(data)
+                else:
+                    content_hash = store.content_hash(source)
+            except OSError as e:
+                stats['errors'].append((source, str(e)))
+                continue
+            clean = store.is_clean(content_hash, fingerprint_of(source))
+            # 已知符合风格；或只检查整个文件时已知需要修改
+            if clean or (clean is False and check and ranges is None):
+                stats['files'] += 1
+                stats['cached'] += 1
+                if not clean:
+                    stats['changed'] += 1
+                    stats['changed_files'].append(source)
+                continue
+            hashes[source] = content_hash
+        tasks.append((source, target, ranges, data))
+
+    whole_files = {source for source, _, ranges, _ in tasks if ranges is None}
+
+    def record(source, changed, clean):
+        if store is None or source not in hashes:
+            return
+        fingerprint = fingerprint_of(source)
+        store.put(hashes[source], fingerprint, clean)
+        if changed and not check and source in whole_files:
+            # 整个文件已格式化并写回，记下新内容，下次直接跳过
+            store.mark_clean(source, fingerprint)
+
+    jobs = jobs or os.cpu_count() or 1
+    if _split_single_file(tasks, jobs, check):
+        _collect([_format_file_parallel(tasks[0], settings, jobs)], stats, record)
+    elif jobs == 1 or len(tasks) <= 1:
+        _init_worker(settings, check)
+        _collect(map(_format_file, tasks), stats, record)
+    else:
+        chunksize = max(1, len(tasks) // (jobs * 8))
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                 initargs=(settings, check)) as executor:
+            _collect(executor.map(_format_file, tasks, chunksize=chunksize), stats, record)
+
+    stats['seconds'] = time.perf_counter() - start
+    return stats
+
+
+def _collect(results, stats, record=None):
+    for source, size, changed, clean, error in results:
+        if error:
+            stats['errors'].append((source, error))
+            continue
+        stats['files'] += 1
+        stats['bytes'] += size
+        if changed:
+            stats['changed'] += 1
+            stats['changed_files'].append(source)
+        if record is not None:
+            record(source, changed, clean)
+    return stats
+
+
+def format_report(stats):
+    """生成吞吐量报告"""
+    seconds = max(stats['seconds'], 1e-9)
+    megabytes = stats['bytes'] / (1024 * 1024)
+    cached = f"，缓存命中 {stats['cached']} 个" if stats.get('cached') else ''
+    return (f"格式化 {stats['files']} 个文件（修改 {stats['changed']} 个{cached}），"
+            f"共 {megabytes:.2f} MB，用时 {stats['seconds']:.3f} 秒，"
+            f"{stats['files'] / seconds:.1f} 文件/秒，{megabytes / seconds:.2f} MB/秒")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='批量格式化源文件')
+    parser.add_argument('paths', nargs='*', default=['.'], help='要格式化的文件或目录，默认当前目录')
+    parser.add_argument('--style', choices=['standard', 'concise', 'custom'],
+                        help='代码风格，缺省时使用设置文件中的风格')
+    parser.add_argument('--settings', help='设置文件路径（与 code_style_formatter_settings.json 格式相同）')
+    parser.add_argument('--rules', help=f'自定义规则文件路径，默认为设置文件旁边的 {spacing_rules.RULES_FILE_NAME}')
+    parser.add_argument('--output-dir', help='输出目录，缺省时直接修改原文件')
+    parser.add_argument('--jobs', type=int, default=None, help='工作进程数，默认等于 CPU 核心数')
+    parser.add_argument('--language', choices=['auto'] + language_registry.language_names(),
+                        help='源文件的语言，默认按扩展名识别')
+    parser.add_argument('--extensions',
+                        help='要处理的扩展名，用逗号分隔；默认为 C/C++ 的扩展名，'
+                             '指定 --language 时为该语言的扩展名')
+    parser.add_argument('--git-ref', help='只处理工作区中相对此提交有改动的文件')
+    parser.add_argument('--staged', action='store_true', help='只处理暂存区中有改动的文件')
+    parser.add_argument('--changed-lines', action='store_true',
+                        help='配合 --git-ref/--staged 使用，只修改改动过的行')
+    parser.add_argument('--check', action='store_true', help='只检查不写回，有文件需要格式化时返回 1')
+    parser.add_argument('--cache', help=f'结果缓存文件路径，git 模式下默认为 .git/{CACHE_NAME}')
+    parser.add_argument('--no-cache', action='store_true', help='不使用结果缓存')
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    git_mode = bool(args.git_ref or args.staged)
+    if args.changed_lines and not git_mode:
+        parser.error('--changed-lines 需要同时指定 --git-ref 或 --staged')
+    if args.extensions:
+        extensions = tuple(ext.strip().lower() for ext in args.extensions.split(',') if ext.strip())
+    elif args.language and args.language != 'auto':
+        extensions = language_registry.extensions_for(args.language)
+    else:
+        extensions = DEFAULT_EXTENSIONS
+    try:
+        settings = load_settings(args.settings, args.style, args.language, args.rules)
+        # 规则不合法时在这里报错一次，不必每个文件都报错
+        spacing_rules.compile_rules(settings['custom_rules'])
+    except ValueError as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 2
+
+    line_ranges = None
+    contents = None
+    refused = []
+    cache_path = args.cache
+    if git_mode:
+        try:
+            files = collect_changed_files(args.paths, extensions, args.git_ref, args.staged)
+            if args.staged:
+                if not args.check and not args.output_dir:
+                    # 写回的是工作区中的文件：工作区还有未暂存的改动时，格式化暂存区的内容再写回
+                    # 会丢掉这些改动，格式化工作区的内容又不是将要提交的内容，所以不处理这样的文件
+                    unstaged = {os.path.realpath(path) for path in git_changes.unstaged_files()}
+                    refused = [source for source, _ in files if source in unstaged]
+                    files = [(source, relative) for source, relative in files
+                             if source not in unstaged]
+                # 检查和输出的是将要提交的内容，也就是暂存区中的版本
+                contents = git_changes.index_contents(source for source, _ in files)
+            if args.changed_lines:
+                line_ranges = {os.path.realpath(path): ranges for path, ranges in
+                               git_changes.changed_lines(args.git_ref, args.staged).items()}
+            if cache_path is None:
+                cache_path = os.path.join(git_changes.git_dir(), CACHE_NAME)
+        except git_changes.GitError as e:
+            print(f"错误: {e}", file=sys.stderr)
+            return 2
+    else:
+        files = collect_files(args.paths, extensions)
+
+    if args.output_dir:
+        collisions = output_collisions(files)
+        for relative, sources in collisions:
+            print(f"错误: {', '.join(sources)} 都会输出到 {os.path.join(args.output_dir, relative)}",
+                  file=sys.stderr)
+        if collisions:
+            return 2
+
+    store = ResultStore(cache_path) if cache_path and not args.no_cache else None
+    try:
+        stats = run_batch(files, settings, args.output_dir, args.jobs, store, args.check, line_ranges,
+                          contents)
+    finally:
+        if store is not None:
+            store.close()
+
+    print(format_report(stats))
+    if args.check:
+        for source in stats['changed_files']:
+            print(f"需要格式化: {source}")
+    for source, error in stats['errors']:
+        print(f"错误: {source}: {error}", file=sys.stderr)
+    for source in refused:
+        print(f"错误: {source}: 暂存区与工作区的内容不同，未写回；请先暂存改动，或加 --check 只检查暂存区",
+              file=sys.stderr)
+    if stats['errors'] or refused:
+        return 1
+    return 1 if args.check and stats['changed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
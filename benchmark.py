@@ -0,0 +1,231 @@
+# benchmark.py
+"""格式化性能基准测试
+
+用固定随机种子生成不同规模、不同特征的 C/C++ 代码，测量每种风格和设置组合的
+ns/行、MB/秒和峰值内存，可以输出 JSON 并与保存的基线比较，发现性能回退。
+
+用法示例：
+    python benchmark.py                          # 100 行和 1 万行
+    python benchmark.py --sizes 100,10000,1000000
+    python benchmark.py --json result.json --save-baseline benchmark_baseline.json
+    python benchmark.py --baseline benchmark_baseline.json --threshold 0.2
+"""
+import argparse
+import itertools
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import format_engine
+
+DEFAULT_SIZES = (100, 10000)
+CORPORA = ('mixed', 'strings', 'operators', 'long_lines')
+SEED = 1618
+
+_TYPES = ['int', 'long long', 'double', 'char', 'auto', 'size_t']
+_OPERATORS = ['+', '-', '*', '/', '%', '<<', '>>', '&', '|', '^', '&&', '||',
+              '==', '!=', '<=', '>=', '<', '>']
+_ASSIGNMENTS = ['=', '+=', '-=', '*=', '/=', '%=', '<<=', '>>=', '&=', '|=', '^=']
+
+
+def _name(rng):
+    return rng.choice('abcdefghijklmnopqrstuvwxyz') + str(rng.randrange(1000))
+
+
+def _expression(rng, terms):
+    parts = [_name(rng)]
+    for _ in range(terms - 1):
+        spacing = rng.choice(['', ' '])
+        parts.append(spacing + rng.choice(_OPERATORS) + spacing)
+        parts.append(_name(rng) if rng.random() < 0.7 else str(rng.randrange(100)))
+    return ''.join(parts)
+
+
+def _string(rng):
+    words = ' '.join(rng.choice(['x=1', 'a, b', 'if(x)', '<=', '你好', 'ok;']) for _ in range(3))
+    return '"' + words + '"'
+
+
+def _mixed_line(rng, depth):
+    indent = '    ' * depth
+    kind = rng.randrange(10)
+    if kind == 0:
+        return indent + '// ' + _name(rng) + ' = ' + _expression(rng, 3)
+    if kind == 1:
+        return indent + 'if(' + _expression(rng, 3) + '){'
+    if kind == 2:
+        return indent + '}'
+    if kind == 3:
+        return indent + 'cout<<' + _string(rng) + '<<' + _name(rng) + '<<endl;'
+    if kind == 4:
+        return indent + 'for(int i=0;i<' + _name(rng) + ';i++) ' + _name(rng) + '+=i;'
+    if kind == 5:
+        return ''
+    if kind == 6:
+        return indent + 'return ' + _expression(rng, 2) + ';'
+    return (indent + rng.choice(_TYPES) + ' ' + _name(rng) + rng.choice(['=', ' = ']) +
+            _expression(rng, rng.randrange(2, 5)) + ';')
+
+
+def _strings_line(rng, depth):
+    items = ','.join(_string(rng) for _ in range(rng.randrange(3, 12)))
+    return '    ' * depth + 'const char* ' + _name(rng) + '[]={' + items + '};'
+
+
+def _operators_line(rng, depth):
+    return ('    ' * depth + _name(rng) + rng.choice(_ASSIGNMENTS) +
+            _expression(rng, rng.randrange(6, 16)) + ';')
+
+
+def _long_line(rng, depth):
+    terms = ','.join(_expression(rng, 4) for _ in range(rng.randrange(200, 400)))
+    return 'int ' + _name(rng) + '[]={' + terms + '};'
+
+
+_GENERATORS = {
+    'mixed': _mixed_line,
+    'strings': _strings_line,
+    'operators': _operators_line,
+    'long_lines': _long_line,
+}
+
+
+def generate_corpus(kind, lines, seed=SEED):
+    """生成指定特征和行数的代码，同样的参数总是得到同样的结果"""
+    rng = random.Random(f'{seed}-{kind}-{lines}')
+    generator = _GENERATORS[kind]
+    return '\n'.join(generator(rng, rng.randrange(4)) for _ in range(lines))
+
+
+def setting_combinations():
+    """返回 (名称, 设置) 列表：标准、简洁以及自定义风格的全部开关组合"""
+    combinations = [('standard', {'style': 'standard'}), ('concise', {'style': 'concise'})]
+    switches = ('space_around_operators', 'space_after_comma', 'space_before_parentheses')
+    for values in itertools.product((True, False), repeat=len(switches)):
+        name = 'custom[' + ''.join('1' if value else '0' for value in values) + ']'
+        settings = {'style': 'custom'}
+        settings.update(zip(switches, values))
+        combinations.append((name, settings))
+    return combinations
+
+
+def measure(code, settings, repeat):
+    """返回 (最短用时秒数, 峰值内存字节数, 走快速路径的行比例)
+
+    每次运行前清空行缓存，测量冷启动性能。
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        format_engine.clear_line_memos()
+        start = time.perf_counter()
+        format_engine.format(code, settings)
+        best = min(best, time.perf_counter() - start)
+
+    format_engine.clear_line_memos()
+    before = format_engine.line_stats()
+    tracemalloc.start()
+    format_engine.format(code, settings)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    after = format_engine.line_stats()
+    counts = {key: after[key] - before[key] for key in after}
+    passthrough = counts['passthrough'] / max(1, sum(counts.values()))
+    return best, peak, passthrough
+
+
+def run_benchmarks(sizes, corpora, combinations, repeat):
+    results = []
+    for kind in corpora:
+        for size in sizes:
+            # 超长行语料每行约几 KB，行数缩小 100 倍
+            lines = max(1, size // 100) if kind == 'long_lines' else size
+            code = generate_corpus(kind, lines)
+            nbytes = len(code.encode('utf-8'))
+            runs = repeat if lines <= 100000 else 1
+            for name, settings in combinations:
+                seconds, peak, passthrough = measure(code, settings, runs)
+                results.append({
+                    'corpus': kind,
+                    'lines': lines,
+                    'bytes': nbytes,
+                    'settings': name,
+                    'ns_per_line': seconds * 1e9 / lines,
+                    'mb_per_sec': nbytes / (1024 * 1024) / max(seconds, 1e-9),
+                    'peak_kb': peak / 1024,
+                    'passthrough': passthrough,
+                })
+                print(f"{kind:<11}{lines:>9} 行  {name:<13}"
+                      f"{results[-1]['ns_per_line']:>12.0f} ns/行"
+                      f"{results[-1]['mb_per_sec']:>9.2f} MB/秒"
+                      f"{results[-1]['peak_kb']:>11.0f} KB"
+                      f"{passthrough * 100:>8.0f}% 快速路径")
+    return results
+
+
+def compare_with_baseline(results, baseline, threshold):
+    """与基线比较，返回 ns/行 变慢超过 threshold 的条目"""
+    previous = {(r['corpus'], r['lines'], r['settings']): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        old = previous.get((result['corpus'], result['lines'], result['settings']))
+        if old is None:
+            continue
+        ratio = result['ns_per_line'] / max(old['ns_per_line'], 1e-9)
+        if ratio > 1 + threshold:
+            regressions.append((result, ratio))
+    return regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='代码风格格式化性能基准测试')
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help='语料行数，用逗号分隔，例如 100,10000,1000000')
+    parser.add_argument('--corpora', default=','.join(CORPORA), help='语料类型，用逗号分隔')
+    parser.add_argument('--styles', default='', help='只测试名称以这些前缀开头的设置组合，例如 standard,custom')
+    parser.add_argument('--repeat', type=int, default=3, help='每项重复次数，取最短用时')
+    parser.add_argument('--json', help='把结果写入 JSON 文件')
+    parser.add_argument('--baseline', help='与此基线文件比较')
+    parser.add_argument('--threshold', type=float, default=0.15, help='允许的变慢比例，默认 0.15')
+    parser.add_argument('--save-baseline', help='把本次结果保存为基线')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    corpora = [kind for kind in args.corpora.split(',') if kind]
+    combinations = setting_combinations()
+    if args.styles:
+        prefixes = tuple(args.styles.split(','))
+        combinations = [item for item in combinations if item[0].startswith(prefixes)]
+
+    results = run_benchmarks(sizes, corpora, combinations, args.repeat)
+    report = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=4, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.threshold)
+        for result, ratio in regressions:
+            print(f"性能回退: {result['corpus']} {result['lines']} 行 {result['settings']} "
+                  f"变慢 {(ratio - 1) * 100:.0f}%", file=sys.stderr)
+        if regressions:
+            return 1
+        print('与基线相比没有性能回退')
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,28 @@
 # build.py
 import PyInstaller.__main__
 import os
+import sys
 
-PyInstaller.__main__.run([
+import language_registry
+
+# 用法：python build.py [onefile|onedir]
+#   onefile（默认）：只生成一个 exe，但每次启动都要先解压到临时目录
+#   onedir：生成一个文件夹，启动时不用解压，适合开机自启动
+profile = sys.argv[1] if len(sys.argv) > 1 else 'onefile'
+
+options = [
     'code_style_formatter.py',
-    '--onefile',
     '--windowed',
     '--name=CodeStyleFormatter',
     '--icon=icon.ico'  # 可选：添加图标
-])
+]
+# 语言配置模块在运行时才导入，PyInstaller 分析不到，需要显式列出
+options += [f'--hidden-import={module}' for module, _ in language_registry.LANGUAGES.values()]
+
+if profile == 'onedir':
+    # 不用 UPX 压缩（启动时不必解压缩），并预先编译优化过的字节码（需要 PyInstaller 6.6 以上）
+    options += ['--onedir', '--noupx', '--optimize=1', '--noconfirm']
+else:
+    options += ['--onefile']
+
+PyInstaller.__main__.run(options)
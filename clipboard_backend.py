@@ -0,0 +1,415 @@
+# clipboard_backend.py
+"""剪贴板后端
+
+把剪贴板读写抽象成统一接口，Windows 使用 win32clipboard，
+其他平台使用 pbcopy/wl-copy/xclip 等命令读写，用 NSPasteboard、wl-paste --watch 或 XFixes
+监听变化，测试时可以使用内存剪贴板。
+"""
+import functools
+import platform
+import shutil
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+
+class ClipboardBackend:
+    """剪贴板后端基类"""
+
+    # 是否支持剪贴板序列号（内容每变化一次序列号就会改变）
+    has_sequence = False
+
+    def get_text(self):
+        """获取剪贴板文本，失败时返回 None"""
+        raise NotImplementedError
+
+    def set_text(self, text):
+        """设置剪贴板文本"""
+        raise NotImplementedError
+
+    def sequence_number(self):
+        """返回当前剪贴板序列号，不支持时返回 None"""
+        return None
+
+    def change_marker(self):
+        """返回用于判断剪贴板是否变化的标记
+
+        支持序列号时使用序列号，否则退化为比较剪贴板文本。
+        """
+        if self.has_sequence:
+            return self.sequence_number()
+        return self.get_text()
+
+    @contextmanager
+    def session(self):
+        """在一次打开的剪贴板会话中批量读写
+
+        默认实现没有需要复用的资源，直接返回后端本身。
+        """
+        yield self
+
+    def close(self):
+        """释放后端持有的句柄或辅助进程"""
+        pass
+
+
+class Win32Clipboard(ClipboardBackend):
+    """基于 win32clipboard 的 Windows 剪贴板
+
+    模块只导入一次；在 session() 中剪贴板只打开、关闭一次。
+    """
+
+    has_sequence = True
+    # 剪贴板被其他程序占用时的重试次数和间隔（秒）
+    open_retries = 10
+    open_interval = 0.005
+
+    def __init__(self):
+        import win32clipboard
+        import win32con
+        self._clipboard = win32clipboard
+        self._text_format = win32con.CF_UNICODETEXT
+        self._depth = 0
+
+    @contextmanager
+    def session(self):
+        if self._depth == 0:
+            self._open()
+        self._depth += 1
+        try:
+            yield _Win32Session(self._clipboard, self._text_format)
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                self._clipboard.CloseClipboard()
+
+    def _open(self):
+        for attempt in range(self.open_retries):
+            try:
+                self._clipboard.OpenClipboard()
+                return
+            except Exception:
+                if attempt == self.open_retries - 1:
+                    raise
+                time.sleep(self.open_interval)
+
+    def get_text(self):
+        with self.session() as clip:
+            return clip.get_text()
+
+    def set_text(self, text):
+        with self.session() as clip:
+            clip.set_text(text)
+
+    def sequence_number(self):
+        return self._clipboard.GetClipboardSequenceNumber()
+
+
+class _Win32Session:
+    """已打开的 Windows 剪贴板"""
+
+    def __init__(self, clipboard, text_format):
+        self._clipboard = clipboard
+        self._text_format = text_format
+
+    def get_text(self):
+        try:
+            return self._clipboard.GetClipboardData(self._text_format)
+        except Exception:
+            return None
+
+    def set_text(self, text):
+        self._clipboard.EmptyClipboard()
+        self._clipboard.SetClipboardText(text, self._text_format)
+
+
+class CommandClipboard(ClipboardBackend):
+    """通过命令行工具读写剪贴板（macOS 的 pbcopy，Linux 的 wl-copy/xclip）
+
+    如果提供了监听器，剪贴板每变化一次它的序列号就加一；有了序列号，等待复制时不必反复启动子进程读取内容，
+    读取自己刚写入的内容时也直接返回缓存。watch_command（例如 wl-paste --watch）是输出一行表示一次变化的
+    常驻辅助进程，watcher 是创建其他监听器的工厂。监听器无法启动时退化为比较剪贴板文本，
+    每次轮询都要启动一个读取子进程。
+    """
+
+    def __init__(self, paste_command, copy_command, watch_command=None, watcher=None):
+        self.paste_command = paste_command
+        self.copy_command = copy_command
+        self._lock = threading.Lock()
+        self._cache = None
+        self._cache_sequence = None
+        self._watcher = None
+        if watcher is None and watch_command:
+            watcher = functools.partial(_CommandWatcher, watch_command)
+        if watcher is not None:
+            self._start_watcher(watcher)
+
+    @property
+    def has_sequence(self):
+        return self._watcher is not None and self._watcher.alive()
+
+    def _start_watcher(self, watcher):
+        try:
+            self._watcher = watcher()
+        except OSError:
+            self._watcher = None
+
+    def sequence_number(self):
+        return self._watcher.sequence() if self._watcher is not None else None
+
+    def get_text(self):
+        if self.has_sequence:
+            sequence = self._watcher.sequence()
+            with self._lock:
+                if self._cache_sequence == sequence:
+                    return self._cache
+        result = subprocess.run(self.paste_command, capture_output=True, text=True)
+        return result.stdout if result.returncode == 0 else None
+
+    def set_text(self, text):
+        before = self.sequence_number()
+        subprocess.run(self.copy_command, input=text, text=True)
+        if self.has_sequence:
+            # 等待监听器报告这次写入，之后的读取可以直接使用缓存
+            wait_for_change(self, before, timeout=0.2)
+            with self._lock:
+                self._cache = text
+                self._cache_sequence = self._watcher.sequence()
+
+    def close(self):
+        if self._watcher is not None:
+            self._watcher.close()
+            self._watcher = None
+
+
+class _CommandWatcher:
+    """常驻的监听进程，剪贴板每变化一次输出一行"""
+
+    def __init__(self, command):
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._process = subprocess.Popen(command, stdout=subprocess.PIPE,
+                                         stderr=subprocess.DEVNULL, text=True)
+        threading.Thread(target=self._watch, daemon=True).start()
+
+    def _watch(self):
+        for _ in self._process.stdout:
+            with self._lock:
+                self._sequence += 1
+
+    def alive(self):
+        return self._process.poll() is None
+
+    def sequence(self):
+        with self._lock:
+            return self._sequence
+
+    def close(self):
+        self._process.terminate()
+
+
+class _XFixesWatcher:
+    """X11 剪贴板的监听线程
+
+    xclip 和 xsel 没有监听模式。这里通过 ctypes 调用 libX11 和 libXfixes，
+    订阅 CLIPBOARD 所有者变化的事件（每次复制都会重新设置所有者），不依赖第三方包，也不启动子进程。
+    """
+
+    # XFixesSetSelectionOwnerNotifyMask | XFixesSelectionWindowDestroyNotifyMask
+    # | XFixesSelectionClientCloseNotifyMask
+    EVENT_MASK = 0x7
+    # 检查是否需要退出的间隔（秒）
+    poll_interval = 0.5
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+
+        libraries = []
+        for name in ('X11', 'Xfixes'):
+            path = ctypes.util.find_library(name)
+            if path is None:
+                raise OSError(f'找不到 lib{name}')
+            libraries.append(ctypes.CDLL(path))
+        x11, xfixes = libraries
+        pointer, ulong, integer = ctypes.c_void_p, ctypes.c_ulong, ctypes.c_int
+        try:
+            x11.XOpenDisplay.restype = pointer
+            x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+            x11.XDefaultRootWindow.restype = ulong
+            x11.XDefaultRootWindow.argtypes = [pointer]
+            x11.XInternAtom.restype = ulong
+            x11.XInternAtom.argtypes = [pointer, ctypes.c_char_p, integer]
+            for name in ('XFlush', 'XPending', 'XConnectionNumber', 'XCloseDisplay'):
+                getattr(x11, name).argtypes = [pointer]
+            x11.XNextEvent.argtypes = [pointer, pointer]
+            xfixes.XFixesQueryExtension.argtypes = [pointer, ctypes.POINTER(integer),
+                                                    ctypes.POINTER(integer)]
+            xfixes.XFixesQueryVersion.argtypes = [pointer, ctypes.POINTER(integer),
+                                                  ctypes.POINTER(integer)]
+            xfixes.XFixesSelectSelectionInput.argtypes = [pointer, ulong, ulong, ulong]
+        except AttributeError as e:
+            raise OSError(str(e)) from e
+
+        display = x11.XOpenDisplay(None)
+        if not display:
+            raise OSError('无法连接 X 服务器')
+        first, second = integer(), integer()
+        if not xfixes.XFixesQueryExtension(display, ctypes.byref(first), ctypes.byref(second)):
+            x11.XCloseDisplay(display)
+            raise OSError('X 服务器不支持 XFixes 扩展')
+        # 使用扩展的其他请求之前必须先协商版本
+        first.value, second.value = 5, 0
+        xfixes.XFixesQueryVersion(display, ctypes.byref(first), ctypes.byref(second))
+        xfixes.XFixesSelectSelectionInput(display, x11.XDefaultRootWindow(display),
+                                          x11.XInternAtom(display, b'CLIPBOARD', 0),
+                                          self.EVENT_MASK)
+        x11.XFlush(display)
+
+        self._x11 = x11
+        self._display = display
+        # XEvent 是 24 个 long 大小的联合体，只计数，不解析内容
+        self._event = (ctypes.c_long * 24)()
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+        self._thread.start()
+
+    def _watch(self):
+        import select
+
+        x11 = self._x11
+        display = self._display
+        connection = x11.XConnectionNumber(display)
+        try:
+            while not self._stopped.is_set():
+                # 只在这个线程中使用连接；等待时定期醒来检查是否已关闭
+                if not x11.XPending(display):
+                    select.select([connection], [], [], self.poll_interval)
+                    continue
+                x11.XNextEvent(display, self._event)
+                with self._lock:
+                    self._sequence += 1
+        finally:
+            x11.XCloseDisplay(display)
+
+    def alive(self):
+        return self._thread.is_alive() and not self._stopped.is_set()
+
+    def sequence(self):
+        with self._lock:
+            return self._sequence
+
+    def close(self):
+        self._stopped.set()
+
+
+class _PasteboardWatcher:
+    """macOS 剪贴板的 changeCount，内容每变化一次加一
+
+    通过 ctypes 调用 Objective-C 运行时读取 NSPasteboard，不依赖 pyobjc，也不需要监听线程。
+    """
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+
+        path = ctypes.util.find_library('objc')
+        if path is None:
+            raise OSError('找不到 Objective-C 运行时')
+        objc = ctypes.CDLL(path)
+        ctypes.CDLL('/System/Library/Frameworks/AppKit.framework/AppKit')
+        pointer = ctypes.c_void_p
+        try:
+            objc.objc_getClass.restype = pointer
+            objc.objc_getClass.argtypes = [ctypes.c_char_p]
+            objc.sel_registerName.restype = pointer
+            objc.sel_registerName.argtypes = [ctypes.c_char_p]
+            # objc_msgSend 没有固定的原型，按返回类型分别声明
+            send_object = ctypes.CFUNCTYPE(pointer, pointer, pointer)(('objc_msgSend', objc))
+            send_integer = ctypes.CFUNCTYPE(ctypes.c_long, pointer, pointer)(('objc_msgSend', objc))
+        except AttributeError as e:
+            raise OSError(str(e)) from e
+        pasteboard_class = objc.objc_getClass(b'NSPasteboard')
+        if not pasteboard_class:
+            raise OSError('找不到 NSPasteboard')
+        general = objc.sel_registerName(b'generalPasteboard')
+        self._pasteboard = send_object(pasteboard_class, general)
+        self._change_count = objc.sel_registerName(b'changeCount')
+        self._send = send_integer
+
+    def alive(self):
+        return True
+
+    def sequence(self):
+        return self._send(self._pasteboard, self._change_count)
+
+    def close(self):
+        pass
+
+
+class MemoryClipboard(ClipboardBackend):
+    """内存中的剪贴板，没有系统剪贴板时或测试时使用"""
+
+    has_sequence = True
+
+    def __init__(self, text=''):
+        self._lock = threading.Lock()
+        self._text = text
+        self._sequence = 0
+
+    def get_text(self):
+        with self._lock:
+            return self._text
+
+    def set_text(self, text):
+        with self._lock:
+            self._text = text
+            self._sequence += 1
+
+    def sequence_number(self):
+        with self._lock:
+            return self._sequence
+
+
+# 非 Windows 平台按顺序尝试的剪贴板命令：(读取命令, 写入命令, 监听器工厂)
+_CLIPBOARD_COMMANDS = [
+    (['pbpaste'], ['pbcopy'], _PasteboardWatcher),
+    (['wl-paste', '--no-newline'], ['wl-copy'],
+     functools.partial(_CommandWatcher, ['wl-paste', '--watch', 'echo'])),
+    (['xclip', '-selection', 'clipboard', '-o'], ['xclip', '-selection', 'clipboard'],
+     _XFixesWatcher),
+    (['xsel', '--clipboard', '--output'], ['xsel', '--clipboard', '--input'], _XFixesWatcher),
+]
+
+
+def create_backend():
+    """根据当前平台创建剪贴板后端"""
+    if platform.system() == "Windows":
+        try:
+            return Win32Clipboard()
+        except ImportError:
+            return MemoryClipboard()
+    for paste_command, copy_command, watcher in _CLIPBOARD_COMMANDS:
+        if shutil.which(paste_command[0]) and shutil.which(copy_command[0]):
+            return CommandClipboard(paste_command, copy_command, watcher=watcher)
+    return MemoryClipboard()
+
+
+def wait_for_change(backend, marker, timeout=1.0, interval=0.005, max_interval=0.05):
+    """轮询等待剪贴板相对 marker 发生变化
+
+    轮询间隔从 interval 开始每次翻倍，最多 max_interval。
+    在 timeout 秒内发生变化返回 True，否则返回 False。
+    """
+    deadline = time.perf_counter() + timeout
+    while True:
+        if backend.change_marker() != marker:
+            return True
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return False
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 2, max_interval)
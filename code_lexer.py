@@ -0,0 +1,298 @@
+# code_lexer.py
+"""单遍词法分析器
+
+整行只扫描一次，按顺序产生带类型的记号，供各代码风格在记号流上改写。
+Lexer 按语言配置（运算符、注释、字符串、跨行结构）生成，模块级函数是 C 系语言的默认分析器。
+"""
+import re
+from collections import namedtuple
+
+# 记号类型
+IDENTIFIER = 'identifier'
+NUMBER = 'number'
+STRING = 'string'
+CHAR = 'char'
+COMMENT = 'comment'
+OPERATOR = 'operator'
+PUNCTUATION = 'punctuation'
+WHITESPACE = 'whitespace'
+REGEX = 'regex'
+OTHER = 'other'
+
+Token = namedtuple('Token', ['kind', 'text'])
+
+# 复合运算符必须排在单个运算符前面，保证最长匹配
+COMPOUND_OPERATORS = [
+    '<<=', '>>=',
+    '+=', '-=', '*=', '/=', '%=', '&=', '|=', '^=',
+    '==', '!=', '<=', '>=', '&&', '||', '<<', '>>', '++', '--', '->', '::'
+]
+SINGLE_OPERATORS = ['=', '+', '-', '*', '/', '%', '<', '>', '!', '&', '|', '^', '~']
+
+# 紧凑运算符：成员访问和自增自减，两侧不加空格
+TIGHT_OPERATORS = frozenset(['::', '->', '++', '--'])
+# 可能是一元运算符的符号
+UNARY_CANDIDATES = frozenset(['+', '-', '*', '&'])
+ALWAYS_UNARY = frozenset(['!', '~'])
+# 这些关键字后面的 + - * & 按一元运算符处理
+UNARY_KEYWORDS = frozenset(['return', 'case', 'throw', 'sizeof', 'delete', 'new', 'else', 'do'])
+# 这些标点后面的 + - * & 按一元运算符处理
+UNARY_PUNCTUATION = frozenset(['(', '[', '{', '}', ',', ';', '?', ':'])
+
+DEFAULT_IDENTIFIER = r'[^\W\d]\w*'
+DEFAULT_PUNCTUATION = r'\.\.\.|[()\[\]{},;.?:]'
+_NUMBER_PATTERN = r'\.?\d(?:[eEpP][+-]|[\w.])*'
+# 正则字面量：/ 开头，字符类 [...] 中的 / 不结束字面量，末尾是标志
+_REGEX_PATTERN = r'/(?:\\.|\[(?:\\.|[^\]\\])*\]|[^/\\\[])+/[a-z]*'
+# 原样输出、不改写的记号类型
+_LITERAL_KINDS = frozenset([STRING, CHAR, COMMENT, REGEX])
+
+
+def _quoted(quote):
+    return quote + r'(?:\\.|[^' + quote + r'\\])*' + quote + '?'
+
+
+class Lexer:
+    """按语言配置生成的词法分析器
+
+    跨行结构（块注释、多行字符串）未闭合时，行末状态是它的结束符，否则为 False；
+    下一行以这个状态开始扫描。
+
+    regex_literals 为真时，在应当出现操作数的位置（行首、运算符和部分标点之后、return 等关键字之后）
+    以 / 开头的片段识别为正则字面量。keyword_arguments 为真时括号内的 = 是关键字参数，两侧不加空格。
+    """
+
+    def __init__(self, operators, line_comment='//', block_comments=(('/*', '*/'),),
+                 block_strings=(), string_quotes='"', char_quotes="'",
+                 identifier=DEFAULT_IDENTIFIER, punctuation=DEFAULT_PUNCTUATION,
+                 tight_operators=TIGHT_OPERATORS, unary_candidates=UNARY_CANDIDATES,
+                 always_unary=ALWAYS_UNARY, unary_keywords=UNARY_KEYWORDS,
+                 unary_punctuation=UNARY_PUNCTUATION, regex_literals=False,
+                 keyword_arguments=False):
+        # operators 中较长的运算符必须排在前面
+        self.operators = list(operators)
+        self.identifier = identifier
+        self.line_comment = line_comment
+        self.tight_operators = frozenset(tight_operators)
+        self.unary_candidates = frozenset(unary_candidates)
+        self.always_unary = frozenset(always_unary)
+        self.unary_keywords = frozenset(unary_keywords)
+        self.unary_punctuation = frozenset(unary_punctuation)
+        self.keyword_arguments = keyword_arguments
+        self._regex_match = re.compile(_REGEX_PATTERN).match if regex_literals else None
+
+        # 结束符 -> (匹配到结束符为止的正则, 续行记号类型)
+        self._ends = {}
+        # 未闭合分组名 -> (结束符, 记号类型)
+        self._opens = {}
+        # 跨行结构的开始符，用来快速判断一行是否可能改变跨行状态
+        self.multiline_starts = tuple(start for start, _ in block_comments + block_strings)
+
+        comments = [re.escape(line_comment) + '.*'] if line_comment else []
+        comments += [re.escape(start) + '.*?' + re.escape(end) for start, end in block_comments]
+        closed_strings = [re.escape(start) + r'(?:\\.|[^\\])*?' + re.escape(end)
+                          for start, end in block_strings]
+        opens = []
+        for kind, pairs, body in ((COMMENT, block_comments, '.*?'),
+                                  (STRING, block_strings, r'(?:\\.|[^\\])*?')):
+            for start, end in pairs:
+                name = f'open{len(self._opens)}'
+                self._opens[name] = (end, kind)
+                self._ends[end] = (re.compile(body + re.escape(end), re.DOTALL), kind)
+                opens.append(f'(?P<{name}>' + re.escape(start) + '.*)')
+        self._special = frozenset(self._opens) | {'block_string'}
+        # 注释的开始符，用来区分 literal_spans 找到的注释和字符串
+        self.comment_prefixes = tuple(
+            start for start in [line_comment] + [start for start, _ in block_comments] if start)
+        # 两个字符的注释开始符，相邻记号拼在一起时不能组成它们
+        self._comment_starts = frozenset(
+            start for start in [line_comment] + [start for start, _ in block_comments]
+            if start and len(start) == 2)
+
+        operator_pattern = '|'.join(re.escape(op) for op in self.operators)
+        strings = [_quoted(quote) for quote in string_quotes]
+        chars = [_quoted(quote) for quote in char_quotes]
+
+        # 所有记号合成一个带命名分组的正则，一次 match 识别一个记号
+        parts = [r'(?P<whitespace>\s+)']
+        if comments:
+            parts.append('(?P<comment>' + '|'.join(comments) + ')')
+        if closed_strings:
+            parts.append('(?P<block_string>' + '|'.join(closed_strings) + ')')
+        parts += opens
+        if strings:
+            parts.append('(?P<string>' + '|'.join(strings) + ')')
+        if chars:
+            parts.append('(?P<char>' + '|'.join(chars) + ')')
+        parts += [
+            '(?P<number>' + _NUMBER_PATTERN + ')',
+            '(?P<identifier>' + identifier + ')',
+            '(?P<operator>' + operator_pattern + ')',
+            '(?P<punctuation>' + punctuation + ')',
+            '(?P<other>.)',
+        ]
+        self._token_re = re.compile('|'.join(parts), re.DOTALL)
+        self._operator_re = re.compile(operator_pattern)
+        # 只识别字面量和注释，其余代码由正则引擎内部跳过
+        self._literal_re = re.compile('|'.join(comments + closed_strings + opens + strings + chars),
+                                      re.DOTALL)
+
+    def _continue(self, line, in_comment):
+        """跨行结构的续行：返回结束位置（未结束时为 None）和续行记号类型"""
+        if in_comment is True:
+            # 兼容只用真假表示块注释状态的调用者
+            in_comment = next(iter(self._ends))
+        end_re, kind = self._ends[in_comment]
+        end = end_re.match(line)
+        return (None if end is None else end.end()), kind, in_comment
+
+    def tokenize_line(self, line, in_comment=False):
+        """将一行代码切分为记号
+
+        in_comment 表示本行开始时所在的跨行结构（见类说明）。
+        返回 (记号列表, 行末状态)。
+        """
+        tokens = []
+        pos = 0
+        length = len(line)
+
+        if in_comment:
+            pos, kind, in_comment = self._continue(line, in_comment)
+            if pos is None:
+                if line:
+                    tokens.append(Token(kind, line))
+                return tokens, in_comment
+            tokens.append(Token(kind, line[:pos]))
+
+        match = self._token_re.match
+        regex_match = self._regex_match
+        special = self._special
+        while pos < length:
+            m = match(line, pos)
+            kind = m.lastgroup
+            text = m.group()
+            if kind in special:
+                if kind == 'block_string':
+                    kind = STRING
+                else:
+                    end, kind = self._opens[kind]
+                    tokens.append(Token(kind, text))
+                    return tokens, end
+            elif (regex_match is not None and kind == OPERATOR and text[0] == '/'
+                  and self.expects_operand(_last_significant(tokens))):
+                regex = regex_match(line, pos)
+                if regex is not None:
+                    kind = REGEX
+                    text = regex.group()
+            tokens.append(Token(kind, text))
+            pos += len(text)
+
+        return tokens, False
+
+    def literal_spans(self, line, in_comment=False):
+        """一次扫描找出行内字符串、字符常量、正则字面量和注释的位置
+
+        返回 ([(开始, 结束), ...], 行末状态)。
+        调用者只需处理这些区间之间的代码，再按偏移拼接，不需要占位符。
+        """
+        if self._regex_match is not None and '/' in line:
+            # / 是除号还是正则字面量取决于前面的记号，只能按记号扫描
+            return self._token_spans(line, in_comment)
+
+        spans = []
+        pos = 0
+        if in_comment:
+            pos, _, in_comment = self._continue(line, in_comment)
+            if pos is None:
+                return [(0, len(line))], in_comment
+            spans.append((0, pos))
+
+        for m in self._literal_re.finditer(line, pos):
+            spans.append(m.span())
+            if m.lastgroup is not None:
+                return spans, self._opens[m.lastgroup][0]
+        return spans, False
+
+    def is_comment_span(self, line, start, in_comment=False):
+        """literal_spans 在 start 处找到的区间是否为注释（否则是字符串等字面量）"""
+        if start == 0 and in_comment:
+            if in_comment is True:
+                in_comment = next(iter(self._ends))
+            return self._ends[in_comment][1] == COMMENT
+        return line.startswith(self.comment_prefixes, start)
+
+    def _token_spans(self, line, in_comment):
+        """按记号找出字面量和注释的位置，结果与 literal_spans 相同"""
+        tokens, in_comment = self.tokenize_line(line, in_comment)
+        spans = []
+        pos = 0
+        for token in tokens:
+            end = pos + len(token.text)
+            if token.kind in _LITERAL_KINDS:
+                spans.append((pos, end))
+            pos = end
+        return spans, in_comment
+
+    def is_unary(self, token, previous):
+        """判断运算符记号在当前上下文中是否为一元运算符
+
+        previous 是前一个非空白记号，行首时为 None。
+        """
+        text = token.text
+        if text in self.always_unary:
+            return True
+        if text not in self.unary_candidates:
+            return False
+        return self.expects_operand(previous)
+
+    def expects_operand(self, previous):
+        """前一个非空白记号之后是否应当出现操作数（一元运算符、正则字面量）"""
+        if previous is None:
+            return True
+        if previous.kind == OPERATOR:
+            return previous.text not in self.tight_operators
+        if previous.kind == PUNCTUATION:
+            return previous.text in self.unary_punctuation
+        if previous.kind == IDENTIFIER:
+            return previous.text in self.unary_keywords
+        return False
+
+    def needs_separator(self, left, right):
+        """两个记号直接相连时是否会被识别成别的记号"""
+        if is_word(left) and is_word(right):
+            return True
+        # 数字后面紧跟 . 会被识别成小数点，例如 1 .toString
+        if left.kind == NUMBER and right.text[0] == '.':
+            return True
+        # 正则字面量后面紧跟标识符会被当作标志
+        if left.kind == REGEX and is_word(right):
+            return True
+        if left.kind == OPERATOR and right.kind == OPERATOR:
+            combined = left.text + right.text
+            if self._operator_re.match(combined).end() > len(left.text):
+                return True
+        if left.text[-1] + right.text[0] in self._comment_starts:
+            return True
+        return False
+
+
+def is_word(token):
+    """标识符和数字在一起时需要空格分隔"""
+    return token.kind == IDENTIFIER or token.kind == NUMBER
+
+
+def _last_significant(tokens):
+    """记号列表中最后一个不是空白和注释的记号，没有时为 None"""
+    for token in reversed(tokens):
+        if token.kind != WHITESPACE and token.kind != COMMENT:
+            return token
+    return None
+
+
+# C/C++ 的默认分析器
+C_LEXER = Lexer(COMPOUND_OPERATORS + SINGLE_OPERATORS)
+
+tokenize_line = C_LEXER.tokenize_line
+literal_spans = C_LEXER.literal_spans
+is_unary = C_LEXER.is_unary
+needs_separator = C_LEXER.needs_separator
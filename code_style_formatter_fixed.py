@@ -1,43 +1,75 @@
 # code_style_formatter_fixed.py
+import time
+_IMPORT_START = time.perf_counter()
+
+# 设置窗口、托盘、快捷键相关的模块在第一次用到时才导入，加快开机启动
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
-import pystray
-from pystray import MenuItem as item
-from PIL import Image, ImageDraw
-import keyboard
 import threading
 import json
 import os
 import sys
 import platform
-import time
-import winreg
 import getpass
-import re
+import multiprocessing
+import format_engine
+import language_registry
+import spacing_rules
+import clipboard_backend
+import tray_icon_data
+from format_cache import FormatCache
+from format_metrics import LatencyStats, FormatProfiler
+from format_worker import FormatWorker, format_in_process
+
+try:
+    import winreg
+except ImportError:
+    # 非 Windows 平台没有注册表，自启动相关功能会直接返回 False
+    winreg = None
+
+_IMPORT_END = time.perf_counter()
+
+ICON_URL = "https://cdn.luogu.com.cn/upload/usericon/1394471.png"
 
 class CodeStyleFormatter:
     def __init__(self):
+        # 启动各阶段耗时（秒，从开始导入本模块算起）
+        self.startup_times = {'import': _IMPORT_END - _IMPORT_START}
+        
         # 创建主Tk窗口但不显示
         self.root = tk.Tk()
         self.root.withdraw()  # 隐藏主窗口
         
         self.settings = self.load_settings()
+        # 启动时就把设置编译成格式化计划，第一次按快捷键时不必再编译
+        format_engine.compile_plan(self.settings)
         self.settings_window = None
-        self.setup_tray_icon()
+        self.clipboard = clipboard_backend.create_backend()
+        self.format_cache = FormatCache()
+        data_dir = os.path.dirname(self.get_settings_path())
+        self.latency = LatencyStats(os.path.join(data_dir, 'code_style_formatter_latency.log'))
+        self.profiler = FormatProfiler(data_dir)
+        self.stats_window = None
+        
+        # 先注册快捷键，再创建托盘图标
         self.setup_hotkey()
+        self.startup_times['hotkey_ready'] = time.perf_counter() - _IMPORT_START
+        self.setup_tray_icon()
+        self.startup_times['tray_ready'] = time.perf_counter() - _IMPORT_START
         self.sync_auto_start_status()
         
     def load_settings(self):
         """加载设置"""
-        default_settings = {
-            'style': 'standard',
-            'use_indentation': True,
-            'indent_size': 4,
-            'space_before_parentheses': True,
-            'space_around_operators': True,
-            'space_after_comma': True,
-            'auto_start': False
-        }
+        default_settings = dict(format_engine.DEFAULT_SETTINGS)
+        default_settings['auto_start'] = False
+        # 等待 Ctrl+C 复制完成的最长时间和粘贴后恢复剪贴板前的等待时间（秒）
+        default_settings['copy_timeout'] = 1.0
+        default_settings['paste_delay'] = 0.1
+        # 超过此字符数的选中内容放到子进程中格式化，可再按一次快捷键取消
+        default_settings['process_threshold'] = 200000
+        # 超过此字符数且有多个 CPU 核心时切块后用进程池并行格式化
+        default_settings['parallel_threshold'] = 2000000
+        # 从托盘菜单打开性能分析时记录的格式化次数
+        default_settings['profile_count'] = 10
         
         settings_file = self.get_settings_path()
         
@@ -49,13 +81,21 @@ class CodeStyleFormatter:
                     for key in default_settings:
                         if key in loaded_settings:
                             default_settings[key] = loaded_settings[key]
-                    
-                    return default_settings
-            else:
-                return default_settings
                 
         except Exception as e:
-            return default_settings
+            pass
+        
+        default_settings['custom_rules'] = self.load_custom_rules()
+        return default_settings
+    
+    def load_custom_rules(self):
+        """读取设置文件旁边的自定义规则，文件不存在或规则不合法时不使用自定义规则"""
+        try:
+            rules = spacing_rules.load_rules(spacing_rules.rules_path(self.get_settings_path()))
+            spacing_rules.compile_rules(rules)
+            return rules
+        except Exception as e:
+            return []
     
     def get_settings_path(self):
         """获取设置文件路径"""
@@ -70,8 +110,10 @@ class CodeStyleFormatter:
         """保存设置"""
         try:
             settings_file = self.get_settings_path()
+            # 自定义规则单独保存在规则文件中
+            settings = {key: value for key, value in self.settings.items() if key != 'custom_rules'}
             with open(settings_file, 'w', encoding='utf-8') as f:
-                json.dump(self.settings, f, indent=4, ensure_ascii=False)
+                json.dump(settings, f, indent=4, ensure_ascii=False)
         except Exception as e:
             pass
 
@@ -160,34 +202,61 @@ class CodeStyleFormatter:
         except Exception as e:
             pass
     
+    def get_icon_cache_path(self):
+        """获取缓存的托盘图标路径"""
+        return os.path.join(os.path.dirname(self.get_settings_path()), 'code_style_formatter_icon.png')
+    
     def create_tray_image(self):
-        """从网络加载托盘图标"""
+        """加载托盘图标：优先使用缓存的头像，否则先用预先生成的默认图标"""
+        from PIL import Image
+        from io import BytesIO
+        
+        try:
+            cache_path = self.get_icon_cache_path()
+            if os.path.exists(cache_path):
+                image = Image.open(cache_path)
+                image.load()
+                return image
+        except Exception as e:
+            pass
+        
+        # 头像在后台下载，启动时不等待网络
+        threading.Thread(target=self.download_tray_image, daemon=True).start()
+        return Image.open(BytesIO(tray_icon_data.icon_png_bytes()))
+    
+    def download_tray_image(self):
+        """从网络下载头像作为托盘图标，并缓存到本地供下次启动使用"""
         try:
             import requests
             from io import BytesIO
-            icon_url = "https://cdn.luogu.com.cn/upload/usericon/1394471.png"
+            from PIL import Image
             
             # 下载图片
-            response = requests.get(icon_url)
+            response = requests.get(ICON_URL, timeout=10)
             response.raise_for_status()  # 检查请求是否成功
             
-            # 从内存中打开图片
+            # 从内存中打开图片并调整大小
             image = Image.open(BytesIO(response.content))
-            # 调整大小
-            return image.resize((64, 64), Image.LANCZOS)
+            image = image.resize((64, 64), Image.LANCZOS)
+            image.save(self.get_icon_cache_path(), 'PNG')
+            
+            icon = getattr(self, 'icon', None)
+            if icon is not None:
+                icon.icon = image
         except Exception as e:
-            # 加载失败时使用默认图标
-            width = 64
-            height = 64
-            image = Image.new('RGB', (width, height), color='blue')
-            dc = ImageDraw.Draw(image)
-            dc.text((width//2-10, height//2-10), "C", fill='white')
-            return image
+            # 下载失败时继续使用默认图标
+            pass
     
     def setup_tray_icon(self):
         """设置系统托盘图标"""
+        import pystray
+        from pystray import MenuItem as item
+        
         menu = (
             item('打开设置', self.show_settings),
+            item('性能统计', self.show_latency_stats),
+            item(f"性能分析（接下来 {self.settings.get('profile_count', 10)} 次格式化）",
+                 self.toggle_profiler, checked=lambda menu_item: self.profiler.active),
             item('退出', self.quit_app)
         )
         
@@ -201,332 +270,188 @@ class CodeStyleFormatter:
         )
     
     def setup_hotkey(self):
-        """设置全局快捷键"""
+        """设置全局快捷键，回调只把任务交给工作线程"""
+        self.worker = FormatWorker(self._run_format_job)
         try:
-            keyboard.add_hotkey('ctrl+q', self.format_selected_code)
+            import keyboard
+            keyboard.add_hotkey('ctrl+q', self.worker.submit)
         except Exception as e:
             pass
     
-    def format_selected_code(self):
-        """格式化选中的代码 - 增加重试和错误处理"""
+    def format_selected_code(self, job=None):
+        """格式化选中的代码 - 等待剪贴板真正变化，而不是固定延时
+        
+        每个阶段的耗时都记入 self.latency，异常写入日志。
+        """
+        import keyboard
+        
+        trace = self.latency.trace()
+        original_clipboard = None
         try:
-            # 先保存当前剪贴板内容
-            original_clipboard = self.get_clipboard_text()
-            
-            # 清空剪贴板，确保能检测到新的选中内容
-            self.set_clipboard_text("")
-            time.sleep(0.05)
-            
-            # 模拟 Ctrl+C 复制选中的文本
-            keyboard.send('ctrl+c')
-            time.sleep(0.2)  # 增加等待时间
+            # 保存当前剪贴板内容；不支持序列号的后端只能比较内容，需要先清空剪贴板
+            with trace.span('clipboard_save'):
+                with self.clipboard.session() as clip:
+                    original_clipboard = clip.get_text()
+                    if not self.clipboard.has_sequence:
+                        clip.set_text("")
+                marker = self.clipboard.change_marker()
+            
+            # 模拟 Ctrl+C 复制选中的文本，等待复制真正完成
+            with trace.span('copy_wait'):
+                keyboard.send('ctrl+c')
+                copied = clipboard_backend.wait_for_change(
+                    self.clipboard, marker, timeout=self.settings.get('copy_timeout', 1.0))
             
             # 获取复制后的剪贴板内容
-            new_clipboard = self.get_clipboard_text()
+            with trace.span('clipboard_read'):
+                new_clipboard = self.get_clipboard_text() if copied else None
             
             # 检查是否有选中的文本
             if not new_clipboard or new_clipboard.strip() == "":
                 # 如果没有选中文本，恢复原始剪贴板内容
-                if original_clipboard:
-                    self.set_clipboard_text(original_clipboard)
+                trace.outcome = 'empty'
+                with trace.span('restore'):
+                    if original_clipboard:
+                        self.set_clipboard_text(original_clipboard)
                 return
             
-            # 检查复制的内容是否与原始剪贴板内容相同
-            if new_clipboard == original_clipboard:
+            # 格式化期间不占用剪贴板；任务被取消时恢复原始内容
+            with trace.span('format'):
+                formatted_code = self.apply_code_style(new_clipboard, job)
+            if formatted_code is None or formatted_code == new_clipboard:
+                # 任务被取消，或选中的代码已经符合风格：不必粘贴
+                trace.outcome = 'cancelled' if formatted_code is None else 'unchanged'
+                with trace.span('restore'):
+                    if original_clipboard:
+                        self.set_clipboard_text(original_clipboard)
                 return
             
-            # 有选中的文本，进行格式化
-            selected_code = new_clipboard
-            
-            if selected_code and selected_code.strip():
-                formatted_code = self.apply_code_style(selected_code)
-                
-                # 将格式化后的代码放回剪贴板
+            # 将格式化后的代码放回剪贴板并粘贴
+            with trace.span('paste'):
                 self.set_clipboard_text(formatted_code)
-                time.sleep(0.1)
-                
-                # 粘贴格式化后的代码
                 keyboard.send('ctrl+v')
-                time.sleep(0.1)
                 
-                # 恢复原始剪贴板内容
+                # 目标程序读取剪贴板没有通知，只能短暂等待后再恢复
+                time.sleep(self.settings.get('paste_delay', 0.1))
+            
+            # 恢复原始剪贴板内容
+            with trace.span('restore'):
                 if original_clipboard:
                     self.set_clipboard_text(original_clipboard)
                     
         except Exception as e:
+            self.latency.log_exception(trace)
             # 如果出现异常，尽量恢复原始剪贴板内容
             try:
                 if original_clipboard:
                     self.set_clipboard_text(original_clipboard)
             except:
                 pass
+        finally:
+            self.latency.finish(trace)
+    
+    def _run_format_job(self, job):
+        """工作线程中执行一次格式化，打开性能分析时用 cProfile 记录"""
+        self.profiler.run(self.format_selected_code, job)
     
     def get_clipboard_text(self):
         """获取剪贴板文本"""
         try:
-            if platform.system() == "Windows":
-                import win32clipboard
-                win32clipboard.OpenClipboard()
-                try:
-                    data = win32clipboard.GetClipboardData()
-                except:
-                    data = None
-                win32clipboard.CloseClipboard()
-                return data
-            else:
-                import subprocess
-                result = subprocess.run(['pbpaste'], capture_output=True, text=True)
-                return result.stdout if result.returncode == 0 else None
+            return self.clipboard.get_text()
         except Exception as e:
             return None
     
     def set_clipboard_text(self, text):
         """设置剪贴板文本"""
         try:
-            if platform.system() == "Windows":
-                import win32clipboard
-                import win32con
-                win32clipboard.OpenClipboard()
-                win32clipboard.EmptyClipboard()
-                win32clipboard.SetClipboardText(text, win32con.CF_UNICODETEXT)
-                win32clipboard.CloseClipboard()
-            else:
-                import subprocess
-                subprocess.run(['pbcopy'], input=text, text=True)
+            self.clipboard.set_text(text)
         except Exception as e:
             pass
 
-    def apply_code_style(self, code):
-        """应用代码风格"""
-        if self.settings['style'] == 'standard':
-            return self.apply_standard_style(code)
-        elif self.settings['style'] == 'concise':
-            return self.apply_concise_style(code)
-        elif self.settings['style'] == 'custom':
-            return self.apply_custom_style(code)
-        else:
-            return code
-
-    def apply_standard_style(self, code):
-        """应用标准风格 - 全新的简单实现"""
-        import re
-        
-        lines = code.split('\n')
-        formatted_lines = []
-        
-        for line in lines:
-            # 跳过空行
-            if not line.strip():
-                formatted_lines.append(line)
-                continue
-                
-            # 保留缩进
-            indent_match = re.match(r'^(\s*)', line)
-            indent = indent_match.group(1) if indent_match else ''
-            content = line[len(indent):]
-            
-            # 跳过注释和预处理指令
-            if re.match(r'\s*(//|#|/\*)', content):
-                formatted_lines.append(indent + content)
-                continue
-            
-            # 保护字符串内容
-            protected_content, string_map = self.protect_strings_simple(content)
-            
-            # 处理运算符周围的空格
-            protected_content = self.add_spaces_simple(protected_content)
-            
-            # 处理逗号和分号
-            protected_content = re.sub(r',(?!\s)', ', ', protected_content)
-            protected_content = re.sub(r';(?!\s|$)', '; ', protected_content)
-            
-            # 处理括号
-            if self.settings.get('space_before_parentheses', True):
-                protected_content = re.sub(r'(\w)\(', r'\1 (', protected_content)
-            
-            # 处理大括号
-            protected_content = re.sub(r'\s*\{\s*', ' { ', protected_content)
-            protected_content = re.sub(r'\s*\}\s*', ' } ', protected_content)
-            
-            # 恢复字符串内容
-            content = self.restore_strings_simple(protected_content, string_map)
-            
-            # 清理多余空格
-            content = re.sub(r'\s+', ' ', content).strip()
-            
-            formatted_lines.append(indent + content)
-        
-        return '\n'.join(formatted_lines)
-
-    def protect_strings_simple(self, content):
-        """保护字符串内容 - 简单版本"""
-        import re
-        
-        string_map = {}
-        counter = 0
-        
-        # 保护双引号字符串
-        def protect_double(match):
-            nonlocal counter
-            placeholder = f'__STR_D{counter}__'
-            string_map[placeholder] = match.group(0)
-            counter += 1
-            return placeholder
-        
-        # 保护单引号字符串
-        def protect_single(match):
-            nonlocal counter
-            placeholder = f'__STR_S{counter}__'
-            string_map[placeholder] = match.group(0)
-            counter += 1
-            return placeholder
-        
-        # 先保护双引号字符串
-        protected_content = re.sub(r'"(?:\\.|[^"\\])*"', protect_double, content)
-        # 再保护单引号字符串
-        protected_content = re.sub(r"'(?:\\.|[^'\\])*'", protect_single, protected_content)
-        
-        return protected_content, string_map
-
-    def restore_strings_simple(self, content, string_map):
-        """恢复字符串内容 - 简单版本"""
-        for placeholder, original in string_map.items():
-            content = content.replace(placeholder, original)
-        return content
-
-    def add_spaces_simple(self, content):
-        """在运算符周围添加空格 - 简单版本"""
-        import re
-        
-        # 定义复合运算符（这些不应该被拆分）
-        compound_operators = [
-            '+=', '-=', '*=', '/=', '%=', '&=', '|=', '^=', '<<=', '>>=',
-            '==', '!=', '<=', '>=', '&&', '||', '<<', '>>', '++', '--', '->', '::'
-        ]
-        
-        # 先处理复合运算符 - 确保它们周围有空格
-        for op in compound_operators:
-            # 使用单词边界确保精确匹配
-            content = re.sub(rf'\b{re.escape(op)}\b', f' {op} ', content)
-        
-        # 为单个运算符添加空格
-        single_operators = ['=', '+', '-', '*', '/', '%', '<', '>', '!', '&', '|', '^', '~']
-        
-        for op in single_operators:
-            # 简单的空格添加，使用负向断言避免影响复合运算符
-            pattern = rf'(?<![+\-*/%<>&|^~=!])\s*{re.escape(op)}\s*(?![+\-*/%<>&|^~=!])'
-            content = re.sub(pattern, f' {op} ', content)
-        
-        return content
-
-    def apply_concise_style(self, code):
-        """应用简洁风格 - 全新的简单实现"""
-        import re
-        
-        lines = code.split('\n')
-        formatted_lines = []
-        
-        for line in lines:
-            # 跳过空行
-            if not line.strip():
-                formatted_lines.append(line)
-                continue
-                
-            # 保留缩进
-            indent_match = re.match(r'^(\s*)', line)
-            indent = indent_match.group(1) if indent_match else ''
-            content = line[len(indent):]
-            
-            # 跳过注释和预处理指令
-            if re.match(r'\s*(//|#|/\*)', content):
-                formatted_lines.append(indent + content)
-                continue
-            
-            # 保护字符串内容
-            protected_content, string_map = self.protect_strings_simple(content)
-            
-            # 移除运算符周围的空格
-            protected_content = self.remove_spaces_simple(protected_content)
-            
-            # 恢复字符串内容
-            content = self.restore_strings_simple(protected_content, string_map)
-            
-            formatted_lines.append(indent + content)
-        
-        return '\n'.join(formatted_lines)
-
-    def remove_spaces_simple(self, content):
-        """移除运算符周围的空格 - 简单版本"""
-        import re
-        
-        # 移除所有运算符周围的空格
-        operators = ['=', '+', '-', '*', '/', '%', '<', '>', '!', '&', '|', '^', '~', ',', ';']
-        
-        for op in operators:
-            content = re.sub(rf'\s*{re.escape(op)}\s*', op, content)
-        
-        # 处理括号和大括号
-        content = re.sub(r'\s*\(\s*', '(', content)
-        content = re.sub(r'\s*\)\s*', ')', content)
-        content = re.sub(r'\s*\{\s*', '{', content)
-        content = re.sub(r'\s*\}\s*', '}', content)
-        
-        return content
-
-    def apply_custom_style(self, code):
-        """应用自定义风格"""
-        import re
-        
-        lines = code.split('\n')
-        formatted_lines = []
-        
-        for line in lines:
-            # 跳过空行
-            if not line.strip():
-                formatted_lines.append(line)
-                continue
-                
-            # 保留缩进
-            indent_match = re.match(r'^(\s*)', line)
-            indent = indent_match.group(1) if indent_match else ''
-            content = line[len(indent):]
-            
-            # 跳过注释和预处理指令
-            if re.match(r'\s*(//|#|/\*)', content):
-                formatted_lines.append(indent + content)
-                continue
-            
-            # 保护字符串内容
-            protected_content, string_map = self.protect_strings_simple(content)
-            
-            # 根据自定义设置处理
-            if self.settings.get('space_around_operators', True):
-                protected_content = self.add_spaces_simple(protected_content)
-            else:
-                protected_content = self.remove_spaces_simple(protected_content)
-                
-            if self.settings.get('space_after_comma', True):
-                protected_content = re.sub(r',(?!\s)', ', ', protected_content)
+    def apply_code_style(self, code, job=None):
+        """应用代码风格，相同内容和设置的结果直接从缓存返回
+        
+        快捷键任务中超过阈值的代码在子进程中格式化，更大的代码切块后在多个进程中并行格式化，
+        任务被取消时返回 None。
+        """
+        if job is None or len(code) < self.settings.get('process_threshold', 200000):
+            return self.format_cache.format(code, self.settings)
+        
+        formatted = self.format_cache.get(code, self.settings)
+        if formatted is None:
+            job.cancellable = True
+            if len(code) >= self.settings.get('parallel_threshold', 2000000) and (os.cpu_count() or 1) > 1:
+                import parallel_format
+                formatted = parallel_format.format_parallel(code, dict(self.settings),
+                                                            cancel_event=job.cancel_event)
             else:
-                protected_content = re.sub(r',\s+', ',', protected_content)
-                
-            if self.settings.get('space_before_parentheses', True):
-                protected_content = re.sub(r'(\w)\(', r'\1 (', protected_content)
-            else:
-                protected_content = re.sub(r'\s+\(', '(', protected_content)
-            
-            # 恢复字符串内容
-            content = self.restore_strings_simple(protected_content, string_map)
-            
-            formatted_lines.append(indent + content)
-        
-        return '\n'.join(formatted_lines)
+                formatted = format_in_process(code, dict(self.settings), job)
+            if formatted is not None:
+                self.format_cache.put(code, self.settings, formatted)
+        return formatted
 
     def show_settings(self, icon=None, item=None):
         """显示设置窗口 - 简化版本"""
         # 直接在主线程创建窗口，不经过after
         self._create_settings_window()
     
+    def toggle_profiler(self, icon=None, item=None):
+        """开始或提前结束性能分析，结果保存在设置文件所在目录"""
+        if self.profiler.active:
+            self.profiler.stop()
+        else:
+            self.profiler.start(max(1, int(self.settings.get('profile_count', 10))))
+    
+    def show_latency_stats(self, icon=None, item=None):
+        """显示快捷键格式化各阶段耗时的分位数"""
+        from tkinter import ttk
+        
+        if self.stats_window and self.is_window_alive(self.stats_window):
+            self.stats_window.deiconify()
+            self.stats_window.lift()
+            self.refresh_latency_stats()
+            return
+        
+        self.stats_window = tk.Toplevel(self.root)
+        self.stats_window.title("性能统计")
+        self.stats_window.attributes('-topmost', True)
+        self.stats_window.protocol("WM_DELETE_WINDOW", self.on_stats_close)
+        
+        frame = ttk.Frame(self.stats_window, padding="10")
+        frame.pack(fill='both', expand=True)
+        self.stats_text = tk.Text(frame, width=60, height=12, font=('Consolas', 10))
+        self.stats_text.pack(fill='both', expand=True)
+        self.stats_info = ttk.Label(frame, foreground="gray", wraplength=480)
+        self.stats_info.pack(anchor='w', pady=5)
+        
+        button_frame = ttk.Frame(frame)
+        button_frame.pack(fill='x')
+        ttk.Button(button_frame, text="🔄 刷新", command=self.refresh_latency_stats).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="❌ 关闭", command=self.on_stats_close).pack(side='right', padx=5)
+        
+        self.refresh_latency_stats()
+        self.center_window(self.stats_window)
+    
+    def refresh_latency_stats(self):
+        """刷新性能统计窗口的内容"""
+        self.stats_text.config(state='normal')
+        self.stats_text.delete('1.0', 'end')
+        self.stats_text.insert('1.0', self.latency.summary())
+        self.stats_text.config(state='disabled')
+        
+        info = f"日志: {self.latency.log_path}"
+        if self.profiler.active:
+            info += f"\n性能分析中，还剩 {self.profiler.remaining} 次"
+        if self.profiler.last_dump:
+            info += f"\n最近的性能分析: {self.profiler.last_dump}"
+        self.stats_info.config(text=info)
+    
+    def on_stats_close(self):
+        """关闭性能统计窗口"""
+        if self.stats_window:
+            self.stats_window.destroy()
+            self.stats_window = None
+    
     def _create_settings_window(self):
         """创建设置窗口 - 简化版本"""
         # 如果窗口已存在，则激活它
@@ -539,6 +464,9 @@ class CodeStyleFormatter:
             except Exception as e:
                 self.settings_window = None
         
+        from tkinter import ttk
+        from scrolled_frame import ScrolledFrame
+        
         # 创建新的设置窗口
         self.settings_window = tk.Toplevel(self.root)
         self.settings_window.title("代码风格修改器 - 设置")
@@ -565,6 +493,8 @@ class CodeStyleFormatter:
     
     def on_settings_close(self):
         """处理设置窗口关闭事件"""
+        if getattr(self, 'preview', None):
+            self.preview.cancel()
         if self.settings_window:
             self.settings_window.destroy()
             self.settings_window = None
@@ -580,6 +510,9 @@ class CodeStyleFormatter:
     
     def create_settings_widgets(self, parent):
         """创建设置界面控件"""
+        from tkinter import ttk, scrolledtext
+        from live_preview import LivePreview
+        
         # 开机自启动设置
         autostart_frame = ttk.LabelFrame(parent, text="🚀 开机自启动设置", padding="10")
         autostart_frame.pack(fill='x', pady=5)
@@ -613,6 +546,15 @@ class CodeStyleFormatter:
         ttk.Radiobutton(style_frame, text="自定义风格", 
                        variable=self.style_var, value='custom').pack(anchor='w', pady=2)
         
+        language_subframe = ttk.Frame(style_frame)
+        language_subframe.pack(fill='x', pady=2)
+        ttk.Label(language_subframe, text="代码语言:").pack(side='left')
+        self.language_var = tk.StringVar(value=self.settings.get('language', 'auto'))
+        ttk.Combobox(language_subframe, textvariable=self.language_var, state='readonly', width=12,
+                     values=['auto'] + language_registry.language_names()).pack(side='left', padx=5)
+        ttk.Label(language_subframe, text="auto 表示按代码内容自动识别", 
+                 foreground="gray").pack(side='left')
+        
         # 自定义设置
         custom_frame = ttk.LabelFrame(parent, text="⚙️ 自定义设置", padding="10")
         custom_frame.pack(fill='x', pady=5)
@@ -629,6 +571,15 @@ class CodeStyleFormatter:
         ttk.Checkbutton(custom_frame, text="括号前添加空格", 
                        variable=self.space_parentheses_var).pack(anchor='w', pady=2)
         
+        # 自定义规则
+        rules_frame = ttk.Frame(custom_frame)
+        rules_frame.pack(fill='x', pady=2)
+        self.rules_label = ttk.Label(rules_frame, foreground="gray")
+        self.rules_label.pack(side='left')
+        ttk.Button(rules_frame, text="重新加载规则", 
+                  command=self.reload_custom_rules).pack(side='left', padx=10)
+        self._update_rules_label()
+        
         # 缩进设置
         indent_frame = ttk.LabelFrame(parent, text="📐 缩进设置", padding="10")
         indent_frame.pack(fill='x', pady=5)
@@ -688,6 +639,14 @@ int main() {
         ttk.Button(test_frame, text="测试格式化", 
                   command=self.test_formatting).pack(anchor='w', pady=5)
         
+        # 输入或设置变化时自动在后台刷新预览
+        self.preview = LivePreview(self.root, self._format_preview, self._show_preview)
+        self.test_input.edit_modified(False)
+        self.test_input.bind('<<Modified>>', self._on_test_input_modified)
+        for var in (self.style_var, self.language_var, self.space_operators_var, self.space_comma_var,
+                    self.space_parentheses_var, self.indent_var, self.indent_size_var):
+            var.trace_add('write', lambda *args: self.schedule_preview())
+        
         test_output_frame = ttk.Frame(test_frame)
         test_output_frame.pack(fill='x', pady=5)
         
@@ -695,6 +654,7 @@ int main() {
         self.test_output = scrolledtext.ScrolledText(test_output_frame, height=8, width=60, 
                                                    background='#f0f0f0')
         self.test_output.pack(fill='x', pady=2)
+        self.schedule_preview(delay_ms=0)
         
         # 按钮框架
         button_frame = ttk.Frame(parent)
@@ -715,6 +675,21 @@ int main() {
         ttk.Label(status_frame, text="🎯 快捷键: Ctrl+q 格式化选中的代码", foreground="blue").pack(anchor='w')
         ttk.Label(status_frame, text="💡 提示: 字符串、注释和头文件会被正确保护", 
                  foreground="gray", wraplength=500).pack(anchor='w')
+        cache_stats = self.format_cache.stats()
+        ttk.Label(status_frame, text=f"📦 格式化缓存: 命中 {cache_stats['hits']} 次，未命中 {cache_stats['misses']} 次", 
+                 foreground="gray").pack(anchor='w')
+    
+    def _update_rules_label(self):
+        count = sum(1 for rule in self.settings.get('custom_rules', ()) if rule.get('enabled', True))
+        self.rules_label.config(text=f"自定义规则: {count} 条（{spacing_rules.RULES_FILE_NAME}）")
+    
+    def reload_custom_rules(self):
+        """重新读取规则文件，立即用于预览和格式化"""
+        self.settings['custom_rules'] = self.load_custom_rules()
+        self.format_cache.clear()
+        format_engine.compile_plan(self.settings)
+        self._update_rules_label()
+        self.schedule_preview(delay_ms=0)
     
     def refresh_status(self, status_label):
         """刷新自启动状态显示"""
@@ -726,16 +701,48 @@ int main() {
     
     def test_formatting(self):
         """测试格式化功能"""
+        self.schedule_preview(delay_ms=0)
+    
+    def schedule_preview(self, delay_ms=None):
+        """按界面上尚未保存的设置，在后台刷新测试区域的输出"""
+        try:
+            settings = self.get_ui_settings()
+        except tk.TclError:
+            # 缩进大小输入框暂时为空或不是数字
+            return
         test_code = self.test_input.get('1.0', 'end-1c')
-        formatted = self.apply_code_style(test_code)
-        
+        self.preview.schedule(test_code, settings, delay_ms)
+    
+    def _on_test_input_modified(self, event=None):
+        """测试输入框内容变化"""
+        if self.test_input.edit_modified():
+            self.test_input.edit_modified(False)
+            self.schedule_preview()
+    
+    def _format_preview(self, code, settings, cancel_event):
+        """在后台线程中格式化预览内容"""
+        from live_preview import format_with_cancel
+
+        formatted = self.format_cache.get(code, settings)
+        if formatted is None:
+            formatted = format_with_cancel(code, settings, cancel_event)
+            if formatted is not None:
+                self.format_cache.put(code, settings, formatted)
+        return formatted
+    
+    def _show_preview(self, formatted):
+        """在 Tk 主线程中显示预览结果"""
+        if not (self.settings_window and self.is_window_alive(self.settings_window)):
+            return
         self.test_output.delete('1.0', 'end')
         self.test_output.insert('1.0', formatted)
     
-    def save_settings_from_ui(self):
-        """从UI保存设置"""
-        self.settings.update({
+    def get_ui_settings(self):
+        """读取设置窗口中当前的设置"""
+        settings = dict(self.settings)
+        settings.update({
             'style': self.style_var.get(),
+            'language': self.language_var.get(),
             'use_indentation': self.indent_var.get(),
             'indent_size': self.indent_size_var.get(),
             'space_before_parentheses': self.space_parentheses_var.get(),
@@ -743,7 +750,14 @@ int main() {
             'space_after_comma': self.space_comma_var.get(),
             'auto_start': self.auto_start_var.get(),
         })
+        return settings
+    
+    def save_settings_from_ui(self):
+        """从UI保存设置"""
+        self.settings.update(self.get_ui_settings())
         
+        self.format_cache.clear()
+        format_engine.compile_plan(self.settings)
         self.save_settings()
         success = self.set_auto_start(self.settings['auto_start'])
     
@@ -785,10 +799,26 @@ int main() {
             pass
         
         try:
+            import keyboard
             keyboard.unhook_all()
         except:
             pass
         
+        try:
+            self.worker.stop()
+        except:
+            pass
+        
+        try:
+            self.clipboard.close()
+        except:
+            pass
+        
+        try:
+            self.profiler.stop()
+        except:
+            pass
+        
         try:
             self.root.quit()
             self.root.destroy()
@@ -806,56 +836,23 @@ int main() {
             return False
 
 
-class ScrolledFrame(tk.Frame):
-    """可滚动的Frame组件"""
-    def __init__(self, parent, *args, **kwargs):
-        super().__init__(parent, *args, **kwargs)
-        
-        # 创建Canvas和滚动条
-        self.canvas = tk.Canvas(self, borderwidth=0, highlightthickness=0)
-        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.canvas.yview)
-        self.inner_frame = tk.Frame(self.canvas)
-        
-        # 配置Canvas
-        self.canvas.configure(yscrollcommand=self.scrollbar.set)
-        
-        # 绑定内部Frame的大小变化事件
-        self.inner_frame.bind(
-            "<Configure>",
-            lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all"))
-        )
-        
-        # 在Canvas中创建窗口
-        self.canvas_window = self.canvas.create_window((0, 0), window=self.inner_frame, anchor="nw")
-        
-        # 绑定Canvas大小变化事件
-        self.canvas.bind("<Configure>", self._on_canvas_configure)
-        
-        # 绑定鼠标滚轮事件
-        self._bind_mousewheel()
-        
-        # 布局
-        self.canvas.pack(side="left", fill="both", expand=True)
-        self.scrollbar.pack(side="right", fill="y")
-    
-    def _on_canvas_configure(self, event):
-        """当Canvas大小变化时，调整内部Frame的宽度"""
-        self.canvas.itemconfig(self.canvas_window, width=event.width)
-    
-    def _bind_mousewheel(self):
-        """绑定鼠标滚轮事件"""
-        def _on_mousewheel(event):
-            self.canvas.yview_scroll(int(-1 * (event.delta / 120)), "units")
-        
-        # 绑定到Canvas和内部Frame
-        self.canvas.bind("<MouseWheel>", _on_mousewheel)
-        self.inner_frame.bind("<MouseWheel>", _on_mousewheel)
-
-
 def main():
     """主函数"""
+    # 打包成 exe 后子进程格式化需要
+    multiprocessing.freeze_support()
     try:
         formatter = CodeStyleFormatter()
+        probe = next((arg for arg in sys.argv[1:] if arg.startswith('--startup-probe')), None)
+        if probe is not None:
+            # 只测量启动耗时，输出后立即退出（见 startup_probe.py）。
+            # 打包时使用了 --windowed，没有控制台，所以结果写入参数给出的文件：--startup-probe=路径
+            path = probe.partition('=')[2]
+            if path:
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump(formatter.startup_times, f)
+            else:
+                print(json.dumps(formatter.startup_times), flush=True)
+            formatter._quit_app()
         formatter.run()
     except Exception as e:
         import traceback
@@ -0,0 +1,82 @@
+# format_cache.py
+"""格式化结果缓存
+
+以输入内容的哈希和设置指纹为键，按 LRU 顺序淘汰，总大小超过上限时淘汰最久未用的结果。
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+import format_engine
+
+
+class FormatCache:
+    """格式化结果的 LRU 缓存"""
+
+    def __init__(self, max_chars=8 * 1024 * 1024, max_entries=256):
+        # max_chars 是缓存中输入和输出文本的字符总数上限
+        self.max_chars = max_chars
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(code, settings):
+        """缓存键：内容哈希 + 设置指纹"""
+        digest = hashlib.blake2b(code.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+        return digest, format_engine.settings_fingerprint(settings)
+
+    def format(self, code, settings):
+        """带缓存的 format_engine.format"""
+        formatted = self.get(code, settings)
+        if formatted is None:
+            formatted = format_engine.format(code, settings)
+            self.put(code, settings, formatted)
+        return formatted
+
+    def get(self, code, settings):
+        """查找缓存的结果，未命中时返回 None"""
+        key = self.make_key(code, settings)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return None
+
+    def put(self, code, settings, formatted):
+        """保存在别处（例如子进程中）算出的结果"""
+        self._store(self.make_key(code, settings), formatted, len(code) + len(formatted))
+
+    def _store(self, key, formatted, size):
+        if size > self.max_chars:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = (formatted, size)
+            self._size += size
+            while self._size > self.max_chars or len(self._entries) > self.max_entries:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+
+    def clear(self):
+        """清空缓存（计数器保留）"""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        """返回命中、未命中次数和当前占用"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'chars': self._size,
+            }
@@ -0,0 +1,845 @@
+# format_engine.py
+"""无界面的代码格式化核心
+
+不依赖 tkinter、pystray、keyboard 或 win32，导入代价很低，
+可以在任何平台上直接调用 format(code, settings)。
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict, namedtuple
+from itertools import chain
+
+import language_registry
+import spacing_rules
+from code_lexer import C_LEXER, is_word, Token, WHITESPACE, OPERATOR, COMMENT, PUNCTUATION
+
+# 默认的格式化设置
+DEFAULT_SETTINGS = {
+    'style': 'standard',
+    'use_indentation': True,
+    'indent_size': 4,
+    'space_before_parentheses': True,
+    'space_around_operators': True,
+    'space_after_comma': True,
+    # 'auto' 表示按文件扩展名或代码内容识别，也可以指定 language_registry 中的语言名称
+    'language': 'auto',
+    # 用户自定义的空白规则（见 spacing_rules），在风格格式化之后应用
+    'custom_rules': (),
+}
+
+# 格式化规则的版本：任何会改变输出的修改都要加一，
+# 它参与设置指纹，持久化缓存（ResultStore）中旧版本记下的“已符合风格”因此不再命中
+FORMAT_VERSION = 3
+
+# 每个格式化计划的行缓存最多记住的行数、占用内存的估计上限（字节）、缓存的最长行，
+# 以及最多保留几个编译好的计划。按内存而不只按行数限制，流式处理长行时内存占用仍然平稳
+LINE_MEMO_SIZE = 65536
+LINE_MEMO_BYTES = 4 * 1024 * 1024
+LINE_MEMO_MAX_LINE = 1024
+PLAN_CACHE_SIZE = 8
+# 每个缓存项除了行文本之外的大致开销（键和值的元组、字符串对象头、字典节点）
+_MEMO_ENTRY_OVERHEAD = 256
+
+# 标准风格中两侧总是加空格的大括号
+BRACES = ('{', '}')
+# 简洁风格中两侧去掉空白的标点
+CONCISE_PUNCTUATION = (',', ';', '(', ')', '{', '}')
+# 简洁风格和不在运算符两侧加空格的自定义风格共用的快速路径：空白分隔的词，行尾紧跟大括号和分号
+_CONCISE_PASSTHROUGH = r'(?:\w+(?:\s+\w+)*)?[{};]*\s*'
+# 快速路径行首的右大括号，重新缩进时用来数行首右括号
+_LEADING_CLOSERS_RE = re.compile(r'[}\s]*')
+# 代码片段开头的右括号，不切分记号改写时用来数行首右括号
+_LEADING_BRACKETS_RE = re.compile(r'[)\]}\s]*')
+# 重新缩进时改变嵌套深度的括号
+OPEN_BRACKETS = frozenset(['{', '(', '['])
+CLOSE_BRACKETS = frozenset(['}', ')', ']'])
+
+
+def settings_fingerprint(settings):
+    """根据影响格式化结果的设置项和 FORMAT_VERSION 计算指纹，两者都相同则指纹相同"""
+    relevant = {key: settings.get(key, default) for key, default in DEFAULT_SETTINGS.items()}
+    data = json.dumps([FORMAT_VERSION, relevant], sort_keys=True, ensure_ascii=False)
+    return hashlib.blake2b(data.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def load_settings(settings_file=None, style=None, language=None, rules_file=None):
+    """合并默认设置、设置文件和命令行中的风格、语言
+
+    rules_file 缺省时读取设置文件旁边的自定义规则文件（如果有）。
+    """
+    settings = dict(DEFAULT_SETTINGS)
+    if settings_file:
+        with open(settings_file, 'r', encoding='utf-8') as f:
+            loaded_settings = json.load(f)
+        for key in settings:
+            if key in loaded_settings:
+                settings[key] = loaded_settings[key]
+        if rules_file is None:
+            rules_file = spacing_rules.rules_path(settings_file)
+    if rules_file:
+        settings['custom_rules'] = spacing_rules.load_rules(rules_file)
+    if style:
+        settings['style'] = style
+    if language:
+        settings['language'] = language
+    return settings
+
+
+def format(code, settings=None):
+    """按设置中的风格格式化代码"""
+    if settings is None:
+        settings = DEFAULT_SETTINGS
+    return apply_code_style(code, settings)
+
+
+def apply_code_style(code, settings):
+    """应用代码风格"""
+    style = settings.get('style', 'standard')
+    if style == 'standard':
+        return apply_standard_style(code, settings)
+    elif style == 'concise':
+        return apply_concise_style(code, settings)
+    elif style == 'custom':
+        return apply_custom_style(code, settings)
+    else:
+        return code
+
+
+def apply_standard_style(code, settings):
+    """应用标准风格 - 基于记号流改写"""
+    return _format_code(code, settings, 'standard')
+
+
+def apply_concise_style(code, settings):
+    """应用简洁风格 - 基于记号流改写"""
+    return _format_code(code, settings, 'concise')
+
+
+def apply_custom_style(code, settings):
+    """应用自定义风格 - 基于记号流改写"""
+    return _format_code(code, settings, 'custom')
+
+
+def resolve_language(settings=None, sample=None, filename=None):
+    """设置中指定了语言时直接使用，否则按文件名和代码开头识别"""
+    language = (settings or DEFAULT_SETTINGS).get('language', 'auto')
+    if language != 'auto':
+        return language
+    return language_registry.detect_language(sample, filename)
+
+
+def _format_code(code, settings, style):
+    """整段格式化：按行切分后交给 LineFormatter"""
+    formatter = LineFormatter(settings, style, resolve_language(settings, code))
+    return '\n'.join(map(formatter.format_line, code.split('\n')))
+
+
+def format_edits(code, settings=None, language=None):
+    """返回把 code 格式化所需的改动列表 [(开始, 结束, 替换文本), ...]
+
+    偏移是 code 中的字符下标，按从前到后排列且互不重叠。改动在逐行格式化时直接记录，
+    不需要事后比较整段文本；已经符合风格的行不产生改动，每行只保留真正变化的部分。
+    """
+    language = language or resolve_language(settings, code)
+    format_line = LineFormatter(settings, language=language).format_line
+    edits = []
+    offset = 0
+    for line in code.split('\n'):
+        formatted = format_line(line)
+        if formatted != line:
+            edits.append(_line_edit(offset, line, formatted))
+        offset += len(line) + 1
+    return edits
+
+
+def apply_edits(code, edits):
+    """把 format_edits 返回的改动应用到 code 上"""
+    parts = []
+    pos = 0
+    for start, end, replacement in edits:
+        parts.append(code[pos:start])
+        parts.append(replacement)
+        pos = end
+    parts.append(code[pos:])
+    return ''.join(parts)
+
+
+def _line_edit(offset, line, formatted):
+    """去掉一行改动前后相同的部分"""
+    prefix = len(os.path.commonprefix((line, formatted)))
+    limit = min(len(line), len(formatted)) - prefix
+    suffix = min(limit, len(os.path.commonprefix((line[::-1], formatted[::-1]))))
+    return offset + prefix, offset + len(line) - suffix, formatted[prefix:len(formatted) - suffix]
+
+
+def format_bytes(data, settings=None, language=None):
+    """按字节格式化 UTF-8 代码，换行符（\n 或 \r\n，包括混用的情况）原样保留
+
+    纯 ASCII 的行按 ASCII 解码，只有含非 ASCII 字符的行才按 UTF-8 解码；
+    在当前设置下不会改变的行和没有被改动的行不重新编码，直接使用原来的字节。
+    """
+    if language is None:
+        sample = data[:language_registry.SAMPLE_SIZE].decode('utf-8', 'replace')
+        language = resolve_language(settings, sample)
+    format_bytes_line = LineFormatter(settings, language=language).format_bytes_line
+    formatted_lines = []
+    for raw in data.split(b'\n'):
+        if raw.endswith(b'\r'):
+            formatted_lines.append(format_bytes_line(raw[:-1]) + b'\r')
+        else:
+            formatted_lines.append(format_bytes_line(raw))
+    return b'\n'.join(formatted_lines)
+
+
+def format_lines(lines, settings=None, language=None):
+    """流式格式化
+
+    lines 可以是任意产生文本行的可迭代对象（例如以文本方式打开的文件），
+    行尾的换行符会原样保留。每读入一行就产出一行结果，内存占用与输入大小无关。
+    需要自动识别语言时先读入开头几 KB 作为样本。
+    """
+    if language is None:
+        language, lines = _sniff_lines(lines, settings)
+    formatter = LineFormatter(settings, language=language)
+    yield from map(formatter.format_raw_line, lines)
+
+
+def format_stream(source, target, settings=None, language=None):
+    """从 source 文件对象逐行读取，格式化后写入 target，返回是否有改动"""
+    changed = False
+    if language is None:
+        language, source = _sniff_lines(source, settings)
+    format_raw_line = LineFormatter(settings, language=language).format_raw_line
+    for line in source:
+        formatted = format_raw_line(line)
+        if formatted != line:
+            changed = True
+        target.write(formatted)
+    return changed
+
+
+def _sniff_lines(lines, settings):
+    """按开头的行识别语言，返回 (语言, 包含已读入各行的完整迭代器)"""
+    language = (settings or DEFAULT_SETTINGS).get('language', 'auto')
+    if language != 'auto':
+        return language, lines
+    lines = iter(lines)
+    head = []
+    size = 0
+    for line in lines:
+        head.append(line)
+        size += len(line)
+        if size >= language_registry.SAMPLE_SIZE:
+            break
+    # 按 \n 切分后传入的行不带换行符
+    sample = ''.join(line if line.endswith('\n') else line + '\n' for line in head)
+    return language_registry.detect_language(sample), chain(head, lines)
+
+
+def rewrite_outside_literals(line, func, in_comment=False, lexer=None):
+    """只对字符串、字符常量和注释之外的代码片段调用 func，再按偏移拼接回去
+
+    代价与行长成线性关系，也不会误改代码中恰好与占位符同名的文本。
+    lexer 缺省时按 C 系语言识别字面量。返回 (新行, 行末的跨行状态)。
+    """
+    lexer = lexer or C_LEXER
+    spans, in_comment = lexer.literal_spans(line, in_comment)
+    if not spans:
+        return func(line), in_comment
+
+    parts = []
+    pos = 0
+    for start, end in spans:
+        if start > pos:
+            parts.append(func(line[pos:start]))
+        parts.append(line[start:end])
+        pos = end
+    if pos < len(line):
+        parts.append(func(line[pos:]))
+    return ''.join(parts), in_comment
+
+
+class LineFormatter:
+    """逐行格式化器，块注释和括号深度等跨行状态保存在实例中"""
+
+    def __init__(self, settings=None, style=None, language=None):
+        self.plan = compile_plan(settings, style, language)
+        profile = self.plan.profile
+        self.tokenize_line = profile.lexer.tokenize_line
+        self.literal_spans = profile.lexer.literal_spans
+        self.multiline_starts = profile.lexer.multiline_starts
+        self.skip_prefixes = profile.skip_prefixes
+        self.keep_indent_prefixes = profile.keep_indent_prefixes
+        self.lexer = profile.lexer
+        # 关键字参数的写法取决于所在的括号深度，不重新缩进时也要跟踪深度
+        self.keyword_arguments = profile.lexer.keyword_arguments
+        self.rules = self.plan.rules
+        self.gap = self.plan.gap
+        self.keep_trailing = self.plan.keep_trailing
+        self.rewrite = self.plan.rewrite
+        self.memo = self.plan.memo
+        self.passthrough = self.plan.passthrough
+        self.passthrough_bytes = self.plan.passthrough_bytes
+        # 不保留原始缩进时每层缩进的文本，保留时为 None
+        self.indent_unit = self.plan.indent_unit
+        # 当前行开始时所在的块注释或多行字符串（其结束符），不在其中时为 False
+        self.in_comment = False
+        # 当前行开始时的括号嵌套深度；不截断为 0，括号不配对的片段之后仍能对齐
+        self.depth = 0
+
+    def format_line(self, line):
+        """格式化一行（不含换行符）"""
+        # 跳过空行
+        if not line.strip():
+            return line
+
+        # 按 \n 切分的 \r\n 文本：\r 不属于代码，否则会被当作行尾空白去掉
+        if line[-1] == '\r':
+            return self.format_line(line[:-1]) + '\r'
+
+        content = line.lstrip()
+        indent = line[:len(line) - len(content)]
+
+        # 跳过注释和预处理指令，但仍要跟踪块注释状态
+        if not self.in_comment and content.startswith(self.skip_prefixes):
+            if self.indent_unit is None or content.startswith(self.keep_indent_prefixes):
+                if any(start in content for start in self.multiline_starts):
+                    _, self.in_comment = self.literal_spans(content)
+                return line
+            # 注释行跟随所在代码块缩进；/* */ 之后可能还有代码，括号也要计入深度
+            closing, delta = 0, 0
+            if content.startswith(self.multiline_starts):
+                tokens, self.in_comment = self.tokenize_line(content)
+                closing, delta = _bracket_depth(tokens)
+            line = self._indent(closing) + content
+            self.depth += delta
+            return line
+
+        if self.gap is None:
+            _, self.in_comment = self.literal_spans(content, self.in_comment)
+            return line
+
+        in_comment = self.in_comment
+
+        # 只含标识符、数字、空格、大括号和行尾分号等、在当前设置下不可能改变的行直接输出；
+        # 这样的行没有字面量，自定义规则是否适用只需在整行上查找一次
+        if not in_comment and self.passthrough(content) and (
+                self.rules is None or not self.rules.search(content)):
+            self.memo.passthrough += 1
+            if self.indent_unit is None:
+                if self.keyword_arguments:
+                    self.depth += content.count('{') - content.count('}')
+                return line
+            closing = _LEADING_CLOSERS_RE.match(content).group().count('}')
+            indent = self._indent(closing)
+            self.depth += content.count('{') - content.count('}')
+            return indent + content
+
+        # 相同内容、相同起始状态的行结果相同，直接查表；关键字参数的写法还取决于括号深度
+        if self.keyword_arguments:
+            key = (content, in_comment, self.depth)
+        else:
+            key = (content, in_comment)
+        cached = self.memo.get(key)
+        if cached is None:
+            if self.rewrite is not None:
+                formatted, end_in_comment, closing, delta = self.rewrite(
+                    content, in_comment, self.indent_unit is not None or self.keyword_arguments)
+            else:
+                tokens, end_in_comment = self.tokenize_line(content, in_comment)
+                formatted, closing, delta = _rewrite_tokens(
+                    tokens, self.gap, self.keep_trailing, self.lexer,
+                    self.indent_unit is not None, self.depth)
+            if self.rules is not None:
+                formatted = rewrite_outside_literals(formatted, self.rules.apply, in_comment,
+                                                     self.lexer)[0]
+            cached = (formatted, end_in_comment, closing, delta)
+            self.memo.put(key, cached)
+        formatted, self.in_comment, closing, delta = cached
+
+        # 块注释的后续行保留原始缩进
+        if self.indent_unit is not None and not in_comment:
+            indent = self._indent(closing)
+        self.depth += delta
+        return indent + formatted
+
+    def format_bytes_line(self, raw):
+        """格式化一行 UTF-8 字节（不含换行符），没有改动时返回 raw 本身"""
+        if self.passthrough_bytes is not None and self.indent_unit is None and not self.in_comment:
+            # 字节模式的快速路径只匹配 ASCII，比文本模式更严格
+            content = raw.lstrip()
+            if self.passthrough_bytes(content):
+                self.memo.passthrough += 1
+                if self.keyword_arguments:
+                    self.depth += content.count(b'{') - content.count(b'}')
+                return raw
+        line = raw.decode('ascii') if raw.isascii() else raw.decode('utf-8', 'surrogateescape')
+        formatted = self.format_line(line)
+        if formatted == line:
+            return raw
+        return formatted.encode('utf-8', 'surrogateescape')
+
+    def _indent(self, closing):
+        """行首有 closing 个右括号时本行的缩进"""
+        return self.indent_unit * max(0, self.depth - closing)
+
+    def format_raw_line(self, line):
+        """格式化一行，行尾的 \\n 或 \\r\\n 原样保留"""
+        if line.endswith('\n'):
+            return self.format_line(line[:-1]) + '\n'
+        return self.format_line(line)
+
+
+class LineMemo:
+    """按行内容缓存格式化结果的有界 LRU 表
+
+    键的第一项是行内容，值的第一项是格式化结果；行数和估计的内存占用都有上限，
+    超过 max_line 个字符的行不缓存（这样的长行很少重复）。
+    """
+
+    def __init__(self, max_size=LINE_MEMO_SIZE, max_bytes=LINE_MEMO_BYTES,
+                 max_line=LINE_MEMO_MAX_LINE):
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.max_line = max_line
+        self.hits = 0
+        self.misses = 0
+        # 走快速路径、没有查表的行数（只用于统计，不加锁）
+        self.passthrough = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if len(key[0]) > self.max_line:
+            return
+        size = len(key[0]) + len(value[0]) + _MEMO_ENTRY_OVERHEAD
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(key[0]) + len(old[0]) + _MEMO_ENTRY_OVERHEAD
+            self._entries[key] = value
+            self._size += size
+            while self._size > self.max_bytes or len(self._entries) > self.max_size:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted_key[0]) + len(evicted[0]) + _MEMO_ENTRY_OVERHEAD
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+# 编译好的格式化计划：风格、设置指纹、空白决策函数、是否保留行尾空白、行缓存、
+# 每层缩进的文本（保留原始缩进时为 None）、判断一行不会改变的快速路径匹配函数（文本和字节各一个）、
+# 语言配置、编译好的自定义规则（没有时为 None）、不切分记号的整行改写函数（没有时为 None）
+FormatPlan = namedtuple('FormatPlan', ['style', 'fingerprint', 'gap', 'keep_trailing', 'memo',
+                                       'indent_unit', 'passthrough', 'passthrough_bytes',
+                                       'profile', 'rules', 'rewrite'])
+
+# (风格, 设置指纹, 语言) -> FormatPlan
+_plans = OrderedDict()
+_plans_lock = threading.Lock()
+
+
+def compile_plan(settings=None, style=None, language=None):
+    """把设置编译成不可变的格式化计划
+
+    所有设置项在这里一次性读出并绑定到空白决策函数中，逐行处理时不再查设置。
+    相同风格、设置指纹和语言的计划只编译一次，切换风格时直接复用。
+    language 缺省时使用设置中的语言；设置为 'auto' 时按 C 系语言编译。
+    """
+    if settings is None:
+        settings = DEFAULT_SETTINGS
+    style = style or settings.get('style', 'standard')
+    language = language or settings.get('language', 'auto')
+    if language == 'auto':
+        language = language_registry.DEFAULT_LANGUAGE
+    fingerprint = settings_fingerprint(settings)
+    key = (style, fingerprint, language)
+
+    with _plans_lock:
+        plan = _plans.get(key)
+        if plan is not None:
+            _plans.move_to_end(key)
+            return plan
+
+    profile = language_registry.get_profile(language)
+    builder = _PLAN_BUILDERS.get(style)
+    if builder is None:
+        # 未知风格：原样输出
+        plan = FormatPlan(style, fingerprint, None, True, None, None, None, None, profile, None,
+                          None)
+    else:
+        gap, keep_trailing, passthrough, rewrite = builder(settings, profile.lexer)
+        indent_unit = None
+        if not settings.get('use_indentation', True) and profile.reindent:
+            indent_unit = ' ' * max(0, int(settings.get('indent_size', 4)))
+        # 所有规则合并成一个正则；规则不合法时抛出 ValueError
+        rules = spacing_rules.compile_rules(settings.get('custom_rules'), language)
+        # 有自定义规则时字节模式不走快速路径，交给文本模式逐行判断
+        passthrough_bytes = None
+        if rules is None:
+            passthrough_bytes = re.compile(passthrough.encode('ascii')).fullmatch
+        plan = FormatPlan(style, fingerprint, gap, keep_trailing, LineMemo(), indent_unit,
+                          re.compile(passthrough).fullmatch, passthrough_bytes, profile, rules,
+                          rewrite)
+
+    with _plans_lock:
+        plan = _plans.setdefault(key, plan)
+        if len(_plans) > PLAN_CACHE_SIZE:
+            _plans.popitem(last=False)
+    return plan
+
+
+def line_stats():
+    """汇总所有计划的行统计：快速路径、查表命中和未命中的行数"""
+    with _plans_lock:
+        memos = [plan.memo for plan in _plans.values() if plan.memo is not None]
+    return {
+        'passthrough': sum(memo.passthrough for memo in memos),
+        'hits': sum(memo.hits for memo in memos),
+        'misses': sum(memo.misses for memo in memos),
+    }
+
+
+def clear_line_memos():
+    """清空所有计划的行缓存"""
+    with _plans_lock:
+        plans = list(_plans.values())
+    for plan in plans:
+        if plan.memo is not None:
+            plan.memo.clear()
+
+
+def _rewrite_tokens(tokens, gap, keep_trailing, lexer, track_depth=False, depth=0):
+    """在记号流上重建一行，字符串、字符和注释原样输出
+
+    一元运算符和记号之间是否必须分隔由 lexer 按语言判断。
+
+    track_depth 为真时在同一遍扫描中统计括号：返回 (新行, 行首右括号个数, 深度变化)，
+    否则后两项为 0。lexer.keyword_arguments 为真时总是统计括号，depth 是行首的括号深度，
+    括号内关键字参数的 = 两侧不加空格；同一层括号中前面有类型注解的冒号时仍按运算符处理。
+    """
+    parts = []
+    previous = None
+    previous_unary = False
+    previous_tight = False
+    whitespace = ''
+    closing = 0
+    delta = 0
+    leading = track_depth
+    is_unary = lexer.is_unary
+    needs_separator = lexer.needs_separator
+    keyword_arguments = lexer.keyword_arguments
+    track_depth = track_depth or keyword_arguments
+    # 当前参数中类型注解冒号所在的括号深度，没有时为 None
+    annotated = None
+
+    for token in tokens:
+        kind = token.kind
+        if kind == WHITESPACE:
+            whitespace = token.text
+            continue
+
+        if track_depth:
+            if kind == PUNCTUATION:
+                if token.text in OPEN_BRACKETS:
+                    delta += 1
+                    leading = False
+                elif token.text in CLOSE_BRACKETS:
+                    delta -= 1
+                    if leading:
+                        closing += 1
+                else:
+                    leading = False
+            elif kind != COMMENT:
+                leading = False
+
+        tight = False
+        if keyword_arguments:
+            level = depth + delta
+            if token.text == ':' and kind == PUNCTUATION:
+                annotated = level
+            elif token.text == ',' and annotated is not None and level <= annotated:
+                annotated = None
+            elif token.text == '=' and kind == OPERATOR:
+                tight = level > 0 and annotated != level
+
+        unary = kind == OPERATOR and is_unary(token, previous)
+        if previous is not None:
+            if tight or previous_tight:
+                space = ''
+            else:
+                space = gap(previous, previous_unary, token, unary, whitespace)
+            # 原本相连的记号重新扫描时仍是这两个记号，只有去掉了空白才需要检查
+            if not space and whitespace and needs_separator(previous, token):
+                space = ' '
+            parts.append(space)
+        elif whitespace:
+            parts.append(whitespace)
+
+        parts.append(token.text)
+        previous = token
+        previous_unary = unary
+        previous_tight = tight
+        whitespace = ''
+
+    if keep_trailing and whitespace:
+        parts.append(whitespace)
+    return ''.join(parts), closing, delta
+
+
+def _bracket_depth(tokens):
+    """只统计括号：返回 (行首右括号个数, 深度变化)"""
+    closing = 0
+    delta = 0
+    leading = True
+    for token in tokens:
+        if token.kind == WHITESPACE or token.kind == COMMENT:
+            continue
+        if token.kind == PUNCTUATION and token.text in OPEN_BRACKETS:
+            delta += 1
+            leading = False
+        elif token.kind == PUNCTUATION and token.text in CLOSE_BRACKETS:
+            delta -= 1
+            if leading:
+                closing += 1
+        else:
+            leading = False
+    return closing, delta
+
+
+class _WhitespaceStripper:
+    """简洁风格（以及不在运算符两侧加空格的自定义风格）的整行改写
+
+    这些风格只会去掉运算符和标点两侧的空白，不需要逐个记号决策：
+    字面量之间的代码片段交给一个预编译的正则，回调只在运算符和标点旁边有空白的位置调用，
+    两个运算符之间仍按 needs_separator 保留一个空格。
+    合法代码的结果与 _rewrite_tokens 加上对应的 gap 相同；
+    不合法的记号序列（如 1e+ 5、:::）按字符而不是按记号判断，结果可能不同。
+    """
+
+    def __init__(self, lexer, space_after_comma=False, space_before_parentheses=False):
+        self.lexer = lexer
+        self.space_after_comma = space_after_comma
+        tokens = ('|'.join(re.escape(op) for op in lexer.operators)
+                  + '|[' + re.escape(''.join(CONCISE_PUNCTUATION)) + ']')
+        alternatives = []
+        if space_before_parentheses:
+            # 词后面的左括号前总是一个空格
+            word = r'[\w$]' if '$' in lexer.identifier else r'\w'
+            alternatives.append(r'(?<=' + word + r')\s*(?P<paren>\()\s*')
+        if space_after_comma:
+            alternatives.append(r',(?P<comma>\s*)')
+        alternatives.append(r'(?P<left>' + tokens + r')\s+')
+        alternatives.append(r'\s+(?=' + tokens + ')')
+        # 先按首字符过滤，大多数位置不用逐个尝试运算符
+        first = set(''.join(lexer.operators)) | set(CONCISE_PUNCTUATION)
+        guard = r'(?=[\s' + re.escape(''.join(sorted(first))) + '])'
+        self._sub = re.compile(guard + '(?:' + '|'.join(alternatives) + ')').sub
+        self._token_match = re.compile(tokens).match
+        self._token_fullmatch = re.compile(tokens).fullmatch
+        self._longest = max(len(op) for op in lexer.operators)
+
+    def _replace(self, m):
+        kind = m.lastgroup
+        if kind is None:
+            # 运算符或标点前面的空白
+            return ''
+        if kind == 'paren':
+            return ' ('
+        if kind == 'comma':
+            # 片段末尾的逗号由 _segment 按后面的字面量处理
+            if m.end() == len(m.string):
+                return ','
+            return ',' + (m.group('comma') or ' ')
+        left = m.group('left')
+        right = self._token_match(m.string, m.end())
+        if right is not None:
+            right = right.group()
+            if self.lexer.needs_separator(Token(self._kind(left), left),
+                                          Token(self._kind(right), right)):
+                return left + ' '
+        return left
+
+    @staticmethod
+    def _kind(text):
+        return PUNCTUATION if text in CONCISE_PUNCTUATION else OPERATOR
+
+    def _ends_with_token(self, code):
+        """代码是否以运算符或标点结尾"""
+        length = len(code)
+        return any(self._token_fullmatch(code, length - size)
+                   for size in range(1, min(self._longest, length) + 1))
+
+    def _segment(self, segment, previous, following):
+        """改写两个字面量之间的代码
+
+        previous 和 following 是两侧的字符串或正则字面量；两侧是注释、行首或行尾时为 None，
+        这时紧挨着的空白原样保留。
+        """
+        code = segment.rstrip()
+        tail = segment[len(code):]
+        head = ''
+        if previous is None:
+            stripped = code.lstrip()
+            head = code[:len(code) - len(stripped)]
+            code = stripped
+        elif previous[-1] == '/' and code[:1].isspace() and code.lstrip()[:1] in ('/', '*'):
+            # 正则字面量后面紧跟 / 或 * 会组成注释开始符
+            code = code.lstrip()
+            head = ' '
+        if following is not None and code:
+            if self.space_after_comma and code[-1] == ',':
+                tail = tail or ' '
+            elif tail and self._ends_with_token(code):
+                tail = ' ' if code[-1] == '/' and following[0] == '/' else ''
+        return head + self._sub(self._replace, code) + tail
+
+    def rewrite(self, line, in_comment, track_depth):
+        """改写一行：返回 (新行, 行末状态, 行首右括号个数, 深度变化)
+
+        track_depth 为假时后两项为 0。
+        """
+        lexer = self.lexer
+        spans, end_in_comment = lexer.literal_spans(line, in_comment)
+        parts = []
+        closing = 0
+        delta = 0
+        leading = track_depth
+        previous = None
+        pos = 0
+        for start, end in chain(spans, [(len(line), None)]):
+            if end is None:
+                following = None
+            else:
+                literal = line[start:end]
+                following = None if lexer.is_comment_span(line, start, in_comment) else literal
+            if start > pos:
+                segment = line[pos:start]
+                parts.append(self._segment(segment, previous, following))
+                if track_depth:
+                    if leading:
+                        brackets = _LEADING_BRACKETS_RE.match(segment).group()
+                        closing += sum(map(brackets.count, ')]}'))
+                        leading = len(brackets) == len(segment)
+                    delta += (segment.count('{') + segment.count('(') + segment.count('[')
+                              - segment.count('}') - segment.count(')') - segment.count(']'))
+            if end is None:
+                break
+            parts.append(literal)
+            if following is not None:
+                leading = False
+            previous = following
+            pos = end
+        return ''.join(parts), end_in_comment, closing, delta
+
+
+def _build_standard_plan(settings, lexer):
+    """标准风格：运算符、逗号、分号和大括号两侧加空格，多余空白合并"""
+    tight_operators = lexer.tight_operators
+    space_before_parentheses = bool(settings.get('space_before_parentheses', True))
+
+    def gap(previous, previous_unary, token, unary, whitespace):
+        kept = ' ' if whitespace else ''
+        if previous.kind == COMMENT or token.kind == COMMENT:
+            return kept
+
+        left, right = previous.text, token.text
+        if left in BRACES or right in BRACES:
+            return '' if right in (';', ',') else ' '
+        if left in (',', ';'):
+            return ' '
+        if right == '(' and space_before_parentheses and is_word(previous):
+            return ' '
+        if previous.kind == OPERATOR and left not in tight_operators:
+            return '' if previous_unary else ' '
+        if token.kind == OPERATOR and right not in tight_operators and not unary:
+            return ' '
+        return kept
+
+    # 单个空格分隔的词和大括号，分号只在行尾
+    return gap, False, r'(?:\w+|[{}])(?: (?:\w+|[{}]))*;?', None
+
+
+def _build_concise_plan(settings, lexer):
+    """简洁风格：去掉运算符、标点和括号两侧的空白"""
+
+    def gap(previous, previous_unary, token, unary, whitespace):
+        if previous.kind == COMMENT or token.kind == COMMENT:
+            return whitespace
+        if previous.kind == OPERATOR or token.kind == OPERATOR:
+            return ''
+        if previous.text in CONCISE_PUNCTUATION or token.text in CONCISE_PUNCTUATION:
+            return ''
+        return whitespace
+
+    # 空白分隔的词，行尾紧跟大括号和分号
+    return gap, True, _CONCISE_PASSTHROUGH, _WhitespaceStripper(lexer).rewrite
+
+
+def _build_custom_plan(settings, lexer):
+    """自定义风格：按设置分别处理运算符、逗号和括号"""
+    tight_operators = lexer.tight_operators
+    space_around_operators = bool(settings.get('space_around_operators', True))
+    space_after_comma = bool(settings.get('space_after_comma', True))
+    space_before_parentheses = bool(settings.get('space_before_parentheses', True))
+
+    def gap(previous, previous_unary, token, unary, whitespace):
+        if previous.kind == COMMENT or token.kind == COMMENT:
+            return whitespace
+
+        left, right = previous.text, token.text
+        if right == '(':
+            if space_before_parentheses:
+                if is_word(previous):
+                    return ' '
+            elif is_word(previous) or left in (')', ']'):
+                return ''
+
+        if left == ',':
+            if space_after_comma:
+                return whitespace or ' '
+            return ''
+
+        if space_around_operators:
+            if previous.kind == OPERATOR and left not in tight_operators:
+                return '' if previous_unary else ' '
+            if token.kind == OPERATOR and right not in tight_operators and not unary:
+                return ' '
+        else:
+            if previous.kind == OPERATOR or token.kind == OPERATOR:
+                return ''
+            if left in CONCISE_PUNCTUATION or right in CONCISE_PUNCTUATION:
+                return ''
+        return whitespace
+
+    if space_around_operators:
+        # 大括号和分号两侧的空白原样保留
+        return gap, True, r'[\w{};]+(?:\s+[\w{};]+)*\s*', None
+    stripper = _WhitespaceStripper(lexer, space_after_comma, space_before_parentheses)
+    return gap, True, _CONCISE_PASSTHROUGH, stripper.rewrite
+
+# 风格名称 -> 计划构造函数，参数是 (设置, 语言的词法分析器)，
+# 返回 (空白决策函数, 是否保留行尾空白, 快速路径正则, 整行改写函数)
+# 整行改写函数不为 None 时代替记号流上的 gap 决策，结果必须与之相同
+# 快速路径正则匹配的行只含词、空白、大括号和分号，在该设置下格式化结果一定与原行相同
+_PLAN_BUILDERS = {
+    'standard': _build_standard_plan,
+    'concise': _build_concise_plan,
+    'custom': _build_custom_plan,
+}
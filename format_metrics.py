@@ -0,0 +1,225 @@
+# format_metrics.py
+"""快捷键格式化的分阶段耗时统计和按需性能分析
+
+每次 Ctrl+Q 记录保存剪贴板、等待复制、读取剪贴板、格式化、粘贴、恢复剪贴板各阶段的耗时，
+用最近若干次的滚动窗口计算 p50/p95/p99，并写入按大小轮转的本地日志。
+打开性能分析后，接下来 N 次格式化会用 cProfile 记录，结束后导出 pstats 文件。
+logging、cProfile 和 pstats 在第一次写日志、开始分析时才导入，不拖慢程序启动。
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# 各阶段按执行顺序排列，total 是整次格式化的耗时
+STAGES = ('clipboard_save', 'copy_wait', 'clipboard_read', 'format', 'paste', 'restore', 'total')
+STAGE_NAMES = {
+    'clipboard_save': '保存剪贴板',
+    'copy_wait': '等待复制',
+    'clipboard_read': '读取剪贴板',
+    'format': '格式化',
+    'paste': '粘贴',
+    'restore': '恢复剪贴板',
+    'total': '总计',
+}
+PERCENTILES = (50, 95, 99)
+# 每个阶段保留最近多少次的耗时
+WINDOW_SIZE = 512
+# 日志文件大小上限和保留的旧文件个数
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUP_COUNT = 3
+# 每隔多少次格式化在日志中写一行分位数汇总
+SUMMARY_INTERVAL = 50
+
+
+class Trace:
+    """一次格式化各阶段的耗时"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans = {}
+        self.outcome = 'ok'
+
+    @contextmanager
+    def span(self, stage):
+        """记录 with 块的耗时；同一阶段出现多次时累加"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans[stage] = self.spans.get(stage, 0.0) + time.perf_counter() - start
+
+
+class LatencyStats:
+    """各阶段耗时的滚动窗口，可以计算分位数并写入轮转日志"""
+
+    def __init__(self, log_path=None, window=WINDOW_SIZE):
+        self._lock = threading.Lock()
+        self._samples = {stage: deque(maxlen=window) for stage in STAGES}
+        self.count = 0
+        self.outcomes = {}
+        self.log_path = log_path
+        # 日志在第一次写入时才创建
+        self._logger = None
+        self._logger_created = not log_path
+
+    def trace(self):
+        return Trace()
+
+    @property
+    def logger(self):
+        """轮转日志，没有指定日志路径或无法创建时为 None"""
+        if not self._logger_created:
+            with self._lock:
+                if not self._logger_created:
+                    self._logger = _create_logger(self.log_path)
+                    self._logger_created = True
+        return self._logger
+
+    def finish(self, trace):
+        """一次格式化结束：更新滚动窗口并记录日志"""
+        trace.spans['total'] = time.perf_counter() - trace.start
+        with self._lock:
+            for stage, seconds in trace.spans.items():
+                self._samples[stage].append(seconds)
+            self.count += 1
+            self.outcomes[trace.outcome] = self.outcomes.get(trace.outcome, 0) + 1
+            write_summary = self.count % SUMMARY_INTERVAL == 0
+
+        logger = self.logger
+        if logger is not None:
+            record = {'outcome': trace.outcome}
+            record.update((stage, round(seconds * 1000, 3)) for stage, seconds in trace.spans.items())
+            logger.info('format %s', json.dumps(record, ensure_ascii=False))
+            if write_summary:
+                logger.info('summary %s', json.dumps(self.percentiles(), ensure_ascii=False))
+
+    def log_exception(self, trace):
+        """格式化过程中出现异常：记下堆栈，不再悄悄吞掉"""
+        trace.outcome = 'error'
+        logger = self.logger
+        if logger is not None:
+            logger.exception('format failed')
+
+    def percentiles(self):
+        """返回 {阶段: {'count': 次数, 'p50': 毫秒, ...}}，没有数据的阶段不列出"""
+        with self._lock:
+            samples = {stage: sorted(values) for stage, values in self._samples.items() if values}
+        result = {}
+        for stage in STAGES:
+            values = samples.get(stage)
+            if not values:
+                continue
+            entry = {'count': len(values)}
+            for percent in PERCENTILES:
+                # 最近秩法
+                index = max(0, -(-percent * len(values) // 100) - 1)
+                entry[f'p{percent}'] = round(values[index] * 1000, 3)
+            result[stage] = entry
+        return result
+
+    def summary(self):
+        """适合在窗口中显示的分位数表格"""
+        table = self.percentiles()
+        if not table:
+            return '还没有格式化记录'
+        lines = [f"{'阶段':<10}{'次数':>6}" + ''.join(f"{f'p{p} (ms)':>12}" for p in PERCENTILES)]
+        for stage, entry in table.items():
+            name = STAGE_NAMES[stage]
+            # 中文字符按两个宽度对齐
+            lines.append(name + ' ' * (12 - 2 * len(name)) + f"{entry['count']:>6}" +
+                         ''.join(f"{entry[f'p{p}']:>12.1f}" for p in PERCENTILES))
+        outcomes = '，'.join(f'{name} {count} 次' for name, count in sorted(self.outcomes.items()))
+        lines.append('')
+        lines.append(f'共 {self.count} 次：{outcomes}')
+        return '\n'.join(lines)
+
+
+def _create_logger(log_path):
+    import logging
+    import logging.handlers
+
+    logger = logging.getLogger('code_style_formatter.latency')
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    if not logger.handlers:
+        try:
+            handler = logging.handlers.RotatingFileHandler(
+                log_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT,
+                encoding='utf-8', delay=True)
+        except OSError:
+            return None
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        logger.addHandler(handler)
+    return logger
+
+
+class FormatProfiler:
+    """用 cProfile 记录接下来 N 次格式化，结束后导出 .prof 和按累计耗时排序的文本报告
+
+    只分析工作线程中的代码；放到子进程中格式化的大段代码只能看到等待子进程的时间。
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.remaining = 0
+        self.last_dump = None
+        self._profile = None
+        self._running = None
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self.remaining > 0
+
+    def start(self, count):
+        """分析接下来 count 次格式化"""
+        import cProfile
+
+        with self._lock:
+            self.remaining = count
+            self._profile = cProfile.Profile()
+
+    def stop(self):
+        """提前结束，已经记录的部分照常导出"""
+        with self._lock:
+            profile, self._profile = self._profile, None
+            self.remaining = 0
+            # 正在记录的格式化结束时会自行导出
+            running = profile is not None and profile is self._running
+        if profile is not None and not running:
+            self._dump(profile)
+
+    def run(self, func, *args):
+        """调用 func(*args)，处于分析状态时用 cProfile 记录"""
+        with self._lock:
+            profile = self._running = self._profile
+            if profile is not None:
+                self.remaining -= 1
+                if self.remaining <= 0:
+                    self._profile = None
+        if profile is None:
+            return func(*args)
+        try:
+            return profile.runcall(func, *args)
+        finally:
+            with self._lock:
+                self._running = None
+                finished = self._profile is not profile
+            if finished:
+                self._dump(profile)
+
+    def _dump(self, profile):
+        import pstats
+
+        base = os.path.join(self.output_dir, time.strftime('code_style_formatter_profile_%Y%m%d_%H%M%S'))
+        try:
+            profile.dump_stats(base + '.prof')
+            with open(base + '.txt', 'w', encoding='utf-8') as f:
+                pstats.Stats(profile, stream=f).sort_stats('cumulative').print_stats(40)
+            self.last_dump = base + '.prof'
+        except (OSError, TypeError):
+            # 一次都没运行时没有统计数据可导出
+            pass
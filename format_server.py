@@ -0,0 +1,338 @@
+# format_server.py
+"""常驻的本地格式化服务
+
+编辑器插件和 pre-commit 脚本每次都启动 Python 的代价远大于格式化本身，
+这个服务在一个常驻进程中复用 format_engine、编译好的格式化计划和结果缓存。
+
+协议是 JSON Lines：每行一个请求，服务按顺序每行返回一个响应，客户端可以不等响应连续发送（流水线）。
+    {"id": 1, "op": "format", "code": "int a=b+c;", "settings": {"style": "concise"}}
+    {"id": 1, "ok": true, "result": "int a=b+c;"}
+支持的 op：
+    format    格式化 code，settings 只对本次请求生效
+    edits     与 format 相同，但只返回改动 [[开始, 结束, 替换文本], ...]，偏移是字符下标
+    batch     格式化 items 中的多段代码：[{"code": ..., "settings": ...}, ...]，
+              带 "edits": true 时每段返回改动列表
+    settings  修改本连接的默认设置，返回生效的设置
+    stats     返回请求数、缓存命中率等统计
+出错时返回 {"id": ..., "ok": false, "error": "..."}，连接保持可用。
+
+每个连接最多缓存 MAX_PENDING 个未处理的请求，超过后暂停读取，由 TCP/套接字缓冲向客户端施加背压。
+有 Unix 套接字的平台默认监听 Unix 套接字，Windows 上监听 127.0.0.1 的 TCP 端口。
+
+用法示例：
+    python format_server.py                          # 默认套接字
+    python format_server.py --socket /tmp/fmt.sock --settings code_style_formatter_settings.json
+    python format_server.py --port 8765              # TCP
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import tempfile
+import time
+
+import format_engine
+import language_registry
+from format_cache import FormatCache
+from format_engine import load_settings
+
+DEFAULT_PORT = 8765
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), 'code_style_formatter.sock')
+# 单个请求行的长度上限
+MAX_LINE = 64 * 1024 * 1024
+# 每个连接已读入但还没处理的请求数上限
+MAX_PENDING = 64
+# 超过此字符数的代码放到线程池中格式化，避免长时间阻塞事件循环
+EXECUTOR_THRESHOLD = 256 * 1024
+STYLES = ('standard', 'concise', 'custom')
+LANGUAGES = ('auto',) + tuple(language_registry.language_names())
+
+
+class RequestError(Exception):
+    """请求格式不正确，返回给客户端，不关闭连接"""
+
+
+class FormatServer:
+    """处理 JSON Lines 请求的格式化服务"""
+
+    def __init__(self, settings=None, cache=None):
+        self.settings = dict(settings or format_engine.DEFAULT_SETTINGS)
+        self.cache = cache or FormatCache()
+        self.started = time.time()
+        self.connections = 0
+        self.total_connections = 0
+        self.requests = 0
+        self.errors = 0
+        self.formatted_chars = 0
+        format_engine.compile_plan(self.settings)
+
+    async def handle_connection(self, reader, writer):
+        """一个连接：读取协程把请求放入有界队列，处理协程按顺序执行并写回响应"""
+        self.connections += 1
+        self.total_connections += 1
+        pending = asyncio.Queue(maxsize=MAX_PENDING)
+        processor = asyncio.ensure_future(self._process(pending, writer, dict(self.settings)))
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # 单行超过 MAX_LINE，无法继续定位下一个请求
+                    await pending.put({'error': f'请求超过 {MAX_LINE} 字节'})
+                    break
+                if not line:
+                    break
+                if line.strip():
+                    # 队列满时在这里等待，不再读取套接字
+                    await pending.put(line)
+        except ConnectionError:
+            pass
+        finally:
+            await pending.put(None)
+            await processor
+            self.connections -= 1
+            writer.close()
+
+    async def _process(self, pending, writer, connection_settings):
+        broken = False
+        while True:
+            line = await pending.get()
+            if line is None:
+                break
+            if broken:
+                # 客户端已断开，丢弃剩余请求直到读取协程结束
+                continue
+            response = await self.handle_line(line, connection_settings)
+            try:
+                writer.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+                # 客户端读得慢时在这里等待，写缓冲不会无限增长
+                await writer.drain()
+            except ConnectionError:
+                broken = True
+
+    async def handle_line(self, line, connection_settings):
+        """处理一行请求，返回响应字典"""
+        self.requests += 1
+        request_id = None
+        try:
+            if isinstance(line, dict):
+                raise RequestError(line['error'])
+            try:
+                request = json.loads(line)
+            except ValueError:
+                raise RequestError('请求不是合法的 JSON')
+            if not isinstance(request, dict):
+                raise RequestError('请求必须是 JSON 对象')
+            request_id = request.get('id')
+            result = await self.dispatch(request, connection_settings)
+            return {'id': request_id, 'ok': True, 'result': result}
+        except RequestError as e:
+            self.errors += 1
+            return {'id': request_id, 'ok': False, 'error': str(e)}
+        except Exception as e:
+            self.errors += 1
+            return {'id': request_id, 'ok': False, 'error': f'{type(e).__name__}: {e}'}
+
+    async def dispatch(self, request, connection_settings):
+        op = request.get('op', 'format')
+        if op in ('format', 'edits'):
+            return await self.format_code(request.get('code'), request.get('settings'),
+                                          connection_settings, op == 'edits')
+        if op == 'batch':
+            items = request.get('items')
+            if not isinstance(items, list):
+                raise RequestError('batch 请求需要 items 列表')
+            edits = bool(request.get('edits'))
+            results = []
+            for item in items:
+                if not isinstance(item, dict):
+                    raise RequestError('items 中的每一项必须是 JSON 对象')
+                results.append(await self.format_code(item.get('code'), item.get('settings'),
+                                                      connection_settings, edits))
+            return results
+        if op == 'settings':
+            settings = merge_settings(connection_settings, request.get('settings'))
+            # 先编译，自定义规则不合法时本连接的设置保持不变
+            format_engine.compile_plan(settings)
+            connection_settings.update(settings)
+            return {key: connection_settings[key] for key in format_engine.DEFAULT_SETTINGS}
+        if op == 'stats':
+            return self.stats()
+        raise RequestError(f'未知的 op: {op}')
+
+    async def format_code(self, code, overrides, connection_settings, edits=False):
+        if not isinstance(code, str):
+            raise RequestError('code 必须是字符串')
+        settings = merge_settings(connection_settings, overrides)
+        self.formatted_chars += len(code)
+        func = format_engine.format_edits if edits else self.cache.format
+        if len(code) < EXECUTOR_THRESHOLD:
+            # 小段代码直接在事件循环中格式化，比切换线程快得多
+            return func(code, settings)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, func, code, settings)
+
+    def stats(self):
+        uptime = time.time() - self.started
+        return {
+            'uptime': round(uptime, 3),
+            'connections': self.connections,
+            'total_connections': self.total_connections,
+            'requests': self.requests,
+            'errors': self.errors,
+            'requests_per_sec': round(self.requests / max(uptime, 1e-9), 1),
+            'formatted_chars': self.formatted_chars,
+            'cache': self.cache.stats(),
+        }
+
+
+def merge_settings(base, overrides):
+    """在 base 上应用本次请求的设置，只接受 DEFAULT_SETTINGS 中的键"""
+    if not overrides:
+        return base
+    if not isinstance(overrides, dict):
+        raise RequestError('settings 必须是 JSON 对象')
+    unknown = [key for key in overrides if key not in format_engine.DEFAULT_SETTINGS]
+    if unknown:
+        raise RequestError('未知的设置项: ' + ', '.join(sorted(unknown)))
+    if 'style' in overrides and overrides['style'] not in STYLES:
+        raise RequestError(f"未知的风格: {overrides['style']}")
+    if 'language' in overrides and overrides['language'] not in LANGUAGES:
+        raise RequestError(f"未知的语言: {overrides['language']}")
+    settings = dict(base)
+    settings.update(overrides)
+    return settings
+
+
+def _use_unix_socket(socket_path, port):
+    return port is None and bool(socket_path) and sys.platform != 'win32' and hasattr(socket, 'AF_UNIX')
+
+
+def _socket_in_use(socket_path):
+    """能连接上说明已有服务在监听；连接被拒绝说明是没有进程监听的旧套接字文件"""
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    probe.settimeout(1)
+    try:
+        probe.connect(socket_path)
+        return True
+    except (ConnectionRefusedError, FileNotFoundError):
+        return False
+    except socket.timeout:
+        # 服务忙，来不及接受连接
+        return True
+    finally:
+        probe.close()
+
+
+async def serve(server, socket_path=None, host='127.0.0.1', port=None):
+    """启动监听并一直运行；有 Unix 套接字且没有指定端口时使用 Unix 套接字"""
+    if _use_unix_socket(socket_path, port):
+        if os.path.exists(socket_path):
+            if _socket_in_use(socket_path):
+                raise OSError(f'{socket_path} 上已有服务在监听')
+            # 上次异常退出留下的套接字文件
+            os.unlink(socket_path)
+        listener = await asyncio.start_unix_server(server.handle_connection, socket_path,
+                                                   limit=MAX_LINE)
+        address = socket_path
+    else:
+        listener = await asyncio.start_server(server.handle_connection, host,
+                                              port or DEFAULT_PORT, limit=MAX_LINE)
+        address = f'{host}:{port or DEFAULT_PORT}'
+    print(f'格式化服务已启动: {address}', flush=True)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        if _use_unix_socket(socket_path, port):
+            try:
+                os.unlink(socket_path)
+            except OSError:
+                pass
+
+
+class FormatClient:
+    """同步客户端，供脚本调用；可以连续 send 多个请求再依次 receive"""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, host='127.0.0.1', port=None):
+        if _use_unix_socket(socket_path, port):
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.connect(socket_path)
+        else:
+            self._socket = socket.create_connection((host, port or DEFAULT_PORT))
+        self._reader = self._socket.makefile('rb')
+        self._next_id = 0
+
+    def send(self, op, **fields):
+        """发送一个请求，返回请求 id"""
+        self._next_id += 1
+        fields['id'] = self._next_id
+        fields['op'] = op
+        self._socket.sendall(json.dumps(fields, ensure_ascii=False).encode('utf-8') + b'\n')
+        return self._next_id
+
+    def receive(self):
+        """读取下一个响应，失败时抛出 RuntimeError"""
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError('服务已关闭连接')
+        response = json.loads(line)
+        if not response.get('ok'):
+            raise RuntimeError(response.get('error'))
+        return response['result']
+
+    def request(self, op, **fields):
+        self.send(op, **fields)
+        return self.receive()
+
+    def format(self, code, settings=None):
+        if settings:
+            return self.request('format', code=code, settings=settings)
+        return self.request('format', code=code)
+
+    def edits(self, code, settings=None):
+        """只取回改动，返回 [(开始, 结束, 替换文本), ...]"""
+        fields = {'code': code}
+        if settings:
+            fields['settings'] = settings
+        return [tuple(edit) for edit in self.request('edits', **fields)]
+
+    def close(self):
+        self._reader.close()
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='常驻的本地代码格式化服务')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help=f'Unix 套接字路径，默认 {DEFAULT_SOCKET}')
+    parser.add_argument('--port', type=int, help=f'改用 127.0.0.1 上的 TCP 端口（Windows 默认 {DEFAULT_PORT}）')
+    parser.add_argument('--settings', help='设置文件路径（JSON），作为每个连接的默认设置')
+    parser.add_argument('--style', choices=STYLES, help='覆盖设置文件中的风格')
+    parser.add_argument('--language', choices=LANGUAGES, help='覆盖设置文件中的语言')
+    parser.add_argument('--rules', help='自定义规则文件路径，默认为设置文件旁边的规则文件')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    server = FormatServer(load_settings(args.settings, args.style, args.language, args.rules))
+    try:
+        asyncio.run(serve(server, args.socket, port=args.port))
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
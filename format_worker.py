@@ -0,0 +1,126 @@
+# format_worker.py
+"""快捷键格式化工作线程
+
+快捷键回调只把请求放进有界队列就立即返回，复制、格式化、粘贴都在工作线程中完成。
+排队期间的重复按键会被合并；正在格式化大段代码时再按一次快捷键会取消当前任务。
+超过阈值的大段代码放到子进程中格式化，取消时直接结束子进程。
+"""
+import multiprocessing
+import queue
+import threading
+
+import format_engine
+
+# 子进程格式化时轮询结果和取消标志的间隔（秒）
+POLL_INTERVAL = 0.02
+
+_STOP = object()
+
+
+class FormatJob:
+    """一次快捷键触发的格式化任务"""
+
+    def __init__(self):
+        self.cancel_event = threading.Event()
+        # 只有进入耗时的格式化阶段后，再次按键才会取消任务
+        self.cancellable = False
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+
+class FormatWorker:
+    """在独立线程中依次执行格式化任务"""
+
+    def __init__(self, handler, max_pending=1):
+        # handler(job) 完成一次复制、格式化、粘贴
+        self._handler = handler
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._current = None
+        self.submitted = 0
+        self.coalesced = 0
+        self.cancelled = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self):
+        """快捷键回调：不做任何耗时操作，立即返回"""
+        with self._lock:
+            current = self._current
+            if current is not None:
+                if current.cancellable and not current.cancelled:
+                    # 正在格式化大段代码时再次按键：取消当前任务
+                    current.cancel()
+                    self.cancelled += 1
+                else:
+                    # 同一次选中的内容已在处理中，合并这次按键
+                    self.coalesced += 1
+                return
+        try:
+            self._queue.put_nowait(FormatJob())
+            self.submitted += 1
+        except queue.Full:
+            # 已有任务在排队，它会处理同一段选中内容
+            with self._lock:
+                self.coalesced += 1
+
+    def stop(self):
+        """取消当前任务并结束工作线程"""
+        with self._lock:
+            if self._current is not None:
+                self._current.cancel()
+        try:
+            self._queue.put_nowait(_STOP)
+        except queue.Full:
+            pass
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is _STOP:
+                break
+            with self._lock:
+                self._current = job
+            try:
+                self._handler(job)
+            except Exception:
+                pass
+            finally:
+                with self._lock:
+                    self._current = None
+
+
+def _format_child(conn, code, settings):
+    """子进程入口：格式化后把结果发回父进程"""
+    try:
+        conn.send(format_engine.format(code, settings))
+    finally:
+        conn.close()
+
+
+def format_in_process(code, settings, job):
+    """在子进程中格式化，任务被取消时结束子进程并返回 None"""
+    parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_format_child,
+                                      args=(child_conn, code, settings), daemon=True)
+    process.start()
+    child_conn.close()
+    try:
+        while not job.cancelled:
+            if parent_conn.poll(POLL_INTERVAL):
+                try:
+                    return parent_conn.recv()
+                except EOFError:
+                    # 子进程异常退出时在本线程格式化
+                    return format_engine.format(code, settings)
+        return None
+    finally:
+        parent_conn.close()
+        if process.is_alive():
+            process.terminate()
+        process.join()
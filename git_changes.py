@@ -0,0 +1,137 @@
+# git_changes.py
+"""从 git 获取相对某个提交或暂存区有改动的文件和行"""
+import os
+import re
+import subprocess
+
+_HUNK_RE = re.compile(r'^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@')
+
+
+class GitError(Exception):
+    """git 命令执行失败"""
+
+
+def _git_bytes(args, cwd=None, input=None):
+    try:
+        # 非 ASCII 文件名不转义，diff 中的路径可以直接使用
+        result = subprocess.run(['git', '-c', 'core.quotePath=false'] + args, cwd=cwd,
+                                input=input, capture_output=True)
+    except OSError as e:
+        raise GitError(f'无法运行 git: {e}')
+    if result.returncode != 0:
+        raise GitError(result.stderr.decode('utf-8', 'replace').strip())
+    return result.stdout
+
+
+def _git(args, cwd=None):
+    return _git_bytes(args, cwd).decode('utf-8', 'surrogateescape')
+
+
+def repo_root(cwd=None):
+    return _git(['rev-parse', '--show-toplevel'], cwd).strip()
+
+
+def git_dir(cwd=None):
+    return os.path.abspath(os.path.join(cwd or '.', _git(['rev-parse', '--git-dir'], cwd).strip()))
+
+
+def _diff_args(ref, staged):
+    # 显式指定路径前缀，不受 diff.noprefix、diff.mnemonicPrefix 等配置影响；
+    # 不用 textconv 转换内容，行号与文件本身一致
+    args = ['diff', '--no-color', '--no-ext-diff', '--no-textconv',
+            '--src-prefix=a/', '--dst-prefix=b/', '--diff-filter=ACMR']
+    if staged:
+        args.append('--cached')
+    if ref:
+        args.append(ref)
+    return args
+
+
+def changed_files(ref=None, staged=False, cwd=None):
+    """返回有改动的文件的绝对路径
+
+    staged 为真时比较暂存区，否则比较工作区；ref 缺省时与暂存区/HEAD 比较。
+    比较工作区时也包括未跟踪（且未被忽略）的新文件。
+    """
+    root = repo_root(cwd)
+    names = _git(_diff_args(ref, staged) + ['--name-only', '-z'], root).split('\0')
+    if not staged:
+        names += _git(['ls-files', '--others', '--exclude-standard', '-z'], root).split('\0')
+    files = []
+    seen = set()
+    for name in names:
+        if name and name not in seen:
+            seen.add(name)
+            files.append(os.path.join(root, name))
+    return files
+
+
+def changed_lines(ref=None, staged=False, cwd=None):
+    """返回 {绝对路径: [(起始行, 结束行), ...]}，行号从 1 开始，包含两端
+
+    staged 为真时行号对应暂存区中的内容（见 index_contents）。
+    未跟踪的新文件对应 None，表示整个文件都是新的；只改名或只改权限的文件没有改动的行，对应空列表。
+    """
+    root = repo_root(cwd)
+    # 没有 +++ 段的文件（纯改名、只改权限）也要列出，否则会被当作整个文件都有改动
+    ranges = {os.path.join(root, name): []
+              for name in _git(_diff_args(ref, staged) + ['--name-only', '-z'], root).split('\0')
+              if name}
+    current = None
+    for line in _git(_diff_args(ref, staged) + ['-U0'], root).splitlines():
+        if line.startswith('+++ '):
+            # 含空格的路径后面有一个制表符
+            name = line[4:].rstrip('\t')
+            current = None
+            if name != '/dev/null':
+                current = ranges.setdefault(os.path.join(root, name[2:]), [])
+            continue
+        m = _HUNK_RE.match(line)
+        if m and current is not None:
+            start = int(m.group(1))
+            count = int(m.group(2)) if m.group(2) is not None else 1
+            if count:
+                current.append((start, start + count - 1))
+    if not staged:
+        for name in _git(['ls-files', '--others', '--exclude-standard', '-z'], root).split('\0'):
+            if name:
+                ranges[os.path.join(root, name)] = None
+    return ranges
+
+
+def unstaged_files(cwd=None):
+    """返回工作区内容与暂存区不同的文件的绝对路径集合"""
+    root = repo_root(cwd)
+    names = _git(['diff', '--no-ext-diff', '--name-only', '-z'], root).split('\0')
+    return {os.path.join(root, name) for name in names if name}
+
+
+def index_contents(paths, cwd=None):
+    """用一次 git cat-file --batch 读取文件在暂存区中的内容
+
+    返回 {绝对路径: 字节}；不在暂存区中的文件（或有冲突未解决的文件）不包含在结果中。
+    """
+    root = repo_root(cwd)
+    real_root = os.path.realpath(root)
+    paths = list(paths)
+    if not paths:
+        return {}
+    names = [os.path.relpath(os.path.realpath(path), real_root).replace(os.sep, '/')
+             for path in paths]
+    request = ''.join(f':{name}\n' for name in names).encode('utf-8', 'surrogateescape')
+    output = _git_bytes(['cat-file', '--batch'], root, request)
+
+    contents = {}
+    pos = 0
+    for path in paths:
+        end = output.index(b'\n', pos)
+        header = output[pos:end].split()
+        pos = end + 1
+        if len(header) != 3 or header[-1] == b'missing':
+            # <对象> missing
+            continue
+        size = int(header[2])
+        contents[path] = output[pos:pos + size]
+        # 内容之后还有一个换行符
+        pos += size + 1
+    return contents
@@ -0,0 +1,7 @@
+# lang_c.py
+"""C/C++ 的语言配置"""
+from code_lexer import C_LEXER
+from language_registry import LanguageProfile
+
+# 注释和预处理指令原样保留；预处理指令重新缩进时也保留原始缩进
+PROFILE = LanguageProfile('c', C_LEXER, ('//', '#', '/*'), ('#',), True)
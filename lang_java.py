@@ -0,0 +1,22 @@
+# lang_java.py
+"""Java 的语言配置"""
+from code_lexer import Lexer, SINGLE_OPERATORS
+from language_registry import LanguageProfile
+
+OPERATORS = [
+    '>>>=', '<<=', '>>=', '>>>',
+    '+=', '-=', '*=', '/=', '%=', '&=', '|=', '^=',
+    '==', '!=', '<=', '>=', '&&', '||', '<<', '>>', '++', '--', '->', '::'
+] + SINGLE_OPERATORS
+
+LEXER = Lexer(
+    OPERATORS,
+    # 文本块 """ ... """ 可以跨行
+    block_strings=(('"""', '"""'),),
+    # lambda 的 -> 两侧加空格，方法引用 :: 不加
+    tight_operators=['::', '++', '--'],
+    unary_candidates=['+', '-'],
+    unary_keywords=['return', 'case', 'throw', 'new', 'else', 'do', 'assert', 'yield'],
+)
+
+PROFILE = LanguageProfile('java', LEXER, ('//', '/*'), (), True)
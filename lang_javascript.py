@@ -0,0 +1,31 @@
+# lang_javascript.py
+"""JavaScript/TypeScript 的语言配置
+
+/ 出现在应当是操作数的位置（行首、运算符和左括号等之后、return 等关键字之后）时按正则字面量原样保留，
+其余位置是除号。
+"""
+from code_lexer import Lexer, SINGLE_OPERATORS
+from language_registry import LanguageProfile
+
+OPERATORS = [
+    '>>>=', '===', '!==', '**=', '&&=', '||=', '??=', '<<=', '>>=', '>>>',
+    '+=', '-=', '*=', '/=', '%=', '&=', '|=', '^=',
+    '==', '!=', '<=', '>=', '&&', '||', '??', '?.', '=>', '**', '<<', '>>', '++', '--'
+] + SINGLE_OPERATORS
+
+LEXER = Lexer(
+    OPERATORS,
+    # 模板字符串可以跨行；单引号也是字符串
+    block_strings=(('`', '`'),),
+    string_quotes='"\'',
+    char_quotes='',
+    identifier=r'(?:[^\W\d]|\$)[\w$]*',
+    tight_operators=['?.', '++', '--'],
+    unary_candidates=['+', '-'],
+    unary_keywords=['return', 'case', 'throw', 'new', 'delete', 'else', 'do', 'typeof', 'void',
+                    'in', 'of', 'yield', 'await', 'instanceof'],
+    regex_literals=True,
+)
+
+# 文件开头的 #! 行原样保留
+PROFILE = LanguageProfile('javascript', LEXER, ('//', '/*', '#!'), ('#!',), True)
@@ -0,0 +1,34 @@
+# lang_python.py
+"""Python 的语言配置
+
+缩进决定代码结构，不按括号深度重新缩进；括号内关键字参数和默认值的 = 两侧不加空格，
+带类型注解的默认值除外（def f(a: int = 1)）。
+"""
+from code_lexer import Lexer
+from language_registry import LanguageProfile
+
+OPERATORS = [
+    '**=', '//=', '>>=', '<<=',
+    '+=', '-=', '*=', '/=', '%=', '&=', '|=', '^=', '@=',
+    '==', '!=', '<=', '>=', '<<', '>>', '**', '//', '->', ':=',
+    '=', '+', '-', '*', '/', '%', '<', '>', '&', '|', '^', '~', '@'
+]
+
+LEXER = Lexer(
+    OPERATORS,
+    line_comment='#',
+    block_comments=(),
+    # 三引号字符串可以跨行
+    block_strings=(('"""', '"""'), ("'''", "'''")),
+    string_quotes='"\'',
+    char_quotes='',
+    tight_operators=[],
+    # * 和 ** 在参数列表中是解包，@ 在行首是装饰器
+    unary_candidates=['+', '-', '*', '**', '@'],
+    always_unary=['~'],
+    unary_keywords=['return', 'else', 'in', 'not', 'and', 'or', 'is', 'if', 'yield', 'lambda',
+                    'await'],
+    keyword_arguments=True,
+)
+
+PROFILE = LanguageProfile('python', LEXER, ('#',), ('#',), False)
@@ -0,0 +1,111 @@
+# language_registry.py
+"""按语言选择词法分析器和格式化规则
+
+每种语言的配置放在单独的模块中（lang_c、lang_java 等），第一次用到时才导入并编译记号正则，
+启动时只加载这里的扩展名表和识别规则。
+语言可以由设置指定，也可以按文件扩展名或代码片段自动识别，识别结果在本次运行中缓存。
+"""
+import importlib
+import os
+import re
+import threading
+from collections import OrderedDict, namedtuple
+
+# 语言配置：名称、词法分析器、原样保留的行的前缀（注释、预处理指令等）、
+# 重新缩进时也保留原始缩进的行的前缀、是否允许按括号深度重新缩进
+LanguageProfile = namedtuple('LanguageProfile', ['name', 'lexer', 'skip_prefixes',
+                                                 'keep_indent_prefixes', 'reindent'])
+
+# 语言名称 -> (配置模块, 扩展名)
+LANGUAGES = OrderedDict([
+    ('c', ('lang_c', ('.c', '.h', '.cpp', '.hpp', '.cc', '.hh', '.cxx', '.hxx'))),
+    ('java', ('lang_java', ('.java',))),
+    ('javascript', ('lang_javascript', ('.js', '.mjs', '.cjs', '.jsx', '.ts', '.tsx'))),
+    ('python', ('lang_python', ('.py', '.pyw', '.pyi'))),
+])
+DEFAULT_LANGUAGE = 'c'
+# 自动识别只看代码开头这么多个字符
+SAMPLE_SIZE = 4096
+# 最多记住多少个代码片段的识别结果
+DETECT_CACHE_SIZE = 64
+
+_EXTENSIONS = {ext: name for name, (_, extensions) in LANGUAGES.items() for ext in extensions}
+
+# 识别规则：(语言, 正则, 权重)，每处匹配按权重计分，得分最高的语言胜出
+_HINTS = [(name, re.compile(pattern, re.MULTILINE), weight) for name, pattern, weight in [
+    ('c', r'^\s*#\s*(?:include|define|ifn?def|endif|pragma)\b', 3),
+    ('c', r'\bstd::|\b(?:printf|malloc|sizeof)\s*\(|\w->\w', 2),
+    ('c', r'\b(?:int|void|char|unsigned|struct)\s+\**\w+\s*[(;=\[]', 1),
+    ('java', r'^\s*(?:package|import)\s+[\w.]+(?:\.\*)?\s*;', 3),
+    ('java', r'\b(?:public|private|protected)\s+(?:static\s+|final\s+)*(?:class|interface|enum|void|[A-Z]\w*)\b', 2),
+    ('java', r'\bSystem\.(?:out|err)\.|@Override\b|\bnew\s+[A-Z]\w*\s*[(<]', 2),
+    ('javascript', r'\b(?:const|let|var)\s+[\w$]+\s*=|\bfunction\s*[\w$]*\s*\(', 2),
+    ('javascript', r'=>|===|!==|\bconsole\.\w+\(|\brequire\(|\bexport\s+(?:default|const|function)\b', 2),
+    ('python', r'^\s*(?:def|class)\s+\w+.*:\s*$|^\s*(?:elif|except|finally|with)\b.*:\s*$', 3),
+    ('python', r'^\s*(?:from\s+[\w.]+\s+)?import\s+\w+(?:\s*,\s*\w+)*\s*$|\bself\.\w', 2),
+    ('python', r'^\s*#(?!\s*(?:include|define|ifn?def|endif|pragma)\b)', 1),
+]]
+
+_profiles = {}
+_profiles_lock = threading.Lock()
+_detected = OrderedDict()
+_detected_lock = threading.Lock()
+
+
+def language_names():
+    return list(LANGUAGES)
+
+
+def get_profile(name):
+    """返回语言配置，配置模块在第一次用到时才导入"""
+    profile = _profiles.get(name)
+    if profile is not None:
+        return profile
+    entry = LANGUAGES.get(name)
+    if entry is None:
+        raise ValueError(f'未知的语言: {name}')
+    module = importlib.import_module(entry[0])
+    with _profiles_lock:
+        return _profiles.setdefault(name, module.PROFILE)
+
+
+def extensions_for(name):
+    """语言对应的扩展名"""
+    return LANGUAGES[name][1]
+
+
+def language_for_filename(filename):
+    """按扩展名判断语言，无法判断时返回 None"""
+    return _EXTENSIONS.get(os.path.splitext(filename)[1].lower())
+
+
+def detect_language(sample=None, filename=None):
+    """按扩展名识别语言；没有文件名或扩展名未知时按代码开头的特征打分
+
+    都无法判断时返回 DEFAULT_LANGUAGE。
+    """
+    if filename:
+        name = language_for_filename(filename)
+        if name is not None:
+            return name
+    if not sample:
+        return DEFAULT_LANGUAGE
+    sample = sample[:SAMPLE_SIZE]
+
+    with _detected_lock:
+        name = _detected.get(sample)
+        if name is not None:
+            _detected.move_to_end(sample)
+            return name
+
+    scores = dict.fromkeys(LANGUAGES, 0)
+    for language, pattern, weight in _HINTS:
+        scores[language] += weight * len(pattern.findall(sample))
+    # 同分时按 LANGUAGES 中的顺序取前一个，没有任何特征时为 C
+    name = max(scores, key=scores.get)
+
+    with _detected_lock:
+        _detected[sample] = name
+        if len(_detected) > DETECT_CACHE_SIZE:
+            _detected.popitem(last=False)
+    return name
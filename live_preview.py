@@ -0,0 +1,104 @@
+# live_preview.py
+"""设置窗口的实时预览
+
+输入或设置变化后等待一小段时间（防抖）再在后台线程中格式化，
+新的请求会取消还没完成的旧任务，结果通过 root.after 回到 Tk 主线程显示。
+"""
+import queue
+import threading
+
+import format_engine
+
+# 后台格式化时每处理这么多行检查一次取消标志
+CANCEL_CHECK_LINES = 256
+
+
+def format_with_cancel(code, settings, cancel_event):
+    """可取消的格式化，被取消时返回 None"""
+    formatted_lines = []
+    for index, line in enumerate(format_engine.format_lines(code.split('\n'), settings)):
+        if index % CANCEL_CHECK_LINES == 0 and cancel_event.is_set():
+            return None
+        formatted_lines.append(line)
+    return '\n'.join(formatted_lines)
+
+
+class LivePreview:
+    """防抖、后台执行、丢弃过期结果的预览调度器
+
+    除了后台线程中的格式化，所有方法都只在 Tk 主线程中调用。
+    """
+
+    def __init__(self, root, format_func, on_result, delay_ms=300, poll_ms=30):
+        # format_func(code, settings, cancel_event) 返回结果或 None
+        self.root = root
+        self.format_func = format_func
+        self.on_result = on_result
+        self.delay_ms = delay_ms
+        self.poll_ms = poll_ms
+        self._after_id = None
+        self._poll_id = None
+        self._generation = 0
+        self._cancel_event = None
+        self._results = queue.Queue()
+
+    def schedule(self, code, settings, delay_ms=None):
+        """请求一次预览；在防抖时间内的多次请求只执行最后一次"""
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+        delay = self.delay_ms if delay_ms is None else delay_ms
+        self._after_id = self.root.after(delay, self._start, code, settings)
+
+    def cancel(self):
+        """取消等待中和正在执行的任务"""
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+        if self._poll_id is not None:
+            self.root.after_cancel(self._poll_id)
+            self._poll_id = None
+        if self._cancel_event is not None:
+            self._cancel_event.set()
+            self._cancel_event = None
+        self._generation += 1
+
+    def _start(self, code, settings):
+        self._after_id = None
+        if self._cancel_event is not None:
+            self._cancel_event.set()
+        self._generation += 1
+        generation = self._generation
+        cancel_event = self._cancel_event = threading.Event()
+
+        def work():
+            try:
+                result = self.format_func(code, settings, cancel_event)
+            except Exception:
+                result = None
+            if not cancel_event.is_set():
+                self._results.put((generation, result))
+
+        threading.Thread(target=work, daemon=True).start()
+        if self._poll_id is None:
+            self._poll_id = self.root.after(self.poll_ms, self._poll)
+
+    def _poll(self):
+        self._poll_id = None
+        finished = False
+        latest = None
+        while True:
+            try:
+                generation, result = self._results.get_nowait()
+            except queue.Empty:
+                break
+            # 只显示最新一次请求的结果
+            if generation == self._generation:
+                finished = True
+                latest = result
+
+        if finished:
+            self._cancel_event = None
+            if latest is not None:
+                self.on_result(latest)
+        elif self._cancel_event is not None:
+            self._poll_id = self.root.after(self.poll_ms, self._poll)
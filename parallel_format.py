@@ -0,0 +1,162 @@
+# parallel_format.py
+"""把一大段代码切成若干块，用进程池并行格式化
+
+逐行格式化时跨行的状态只有所在的块注释或多行字符串，以及括号深度（重新缩进、识别关键字参数时用到）。
+切块时尽量选在空行之后、顶格书写的代码行之前，这样的位置几乎不会落在注释或多行字符串中间；
+工作进程假设每块从注释之外开始，返回块末的状态。父进程按顺序拼接时检查这个假设，
+假设不成立的块在父进程中按实际状态重新格式化，所以结果总是与顺序格式化逐字节相同。
+
+重新缩进时工作进程按块开头深度为 0 缩进，同时记下每行相对块开头的缩进层数；
+块开头的实际深度不为 0 时由父进程按层数改正缩进。
+"""
+import multiprocessing
+import os
+from array import array
+
+import format_engine
+
+# 行数少于此值时直接顺序格式化，启动进程池不划算
+MIN_PARALLEL_LINES = 20000
+# 每块至少这么多行
+MIN_CHUNK_LINES = 2000
+# 每个进程分到的块数，块多一些各进程的负载更均衡
+CHUNKS_PER_JOB = 4
+# 从切分点向后最多找多少行合适的边界
+BOUNDARY_WINDOW = 500
+# 等待结果时检查取消标志的间隔（秒）
+POLL_INTERVAL = 0.02
+# 没有重新缩进的行（空行、预处理指令、块注释的后续行等）
+NO_INDENT = -(1 << 62)
+
+# 每个工作进程在初始化时保存一份设置和语言
+_worker_settings = None
+_worker_language = None
+
+
+class ChunkFormatter(format_engine.LineFormatter):
+    """重新缩进时在 level 中记下本行相对块开头的缩进层数"""
+
+    level = NO_INDENT
+
+    def _indent(self, closing):
+        self.level = self.depth - closing
+        return super()._indent(closing)
+
+
+def split_chunks(lines, count):
+    """把行列表切成最多 count 块，返回 [(起始行, 结束行), ...]，不含结束行"""
+    total = len(lines)
+    size = max(MIN_CHUNK_LINES, -(-total // max(1, count)))
+    ranges = []
+    start = 0
+    while total - start >= size + MIN_CHUNK_LINES:
+        limit = min(total - MIN_CHUNK_LINES, start + size + BOUNDARY_WINDOW)
+        end = _find_boundary(lines, start + size, limit)
+        ranges.append((start, end))
+        start = end
+    ranges.append((start, total))
+    return ranges
+
+
+def _find_boundary(lines, target, limit):
+    """在 [target, limit) 中找空行之后顶格书写的第一行，找不到时就在 target 切分"""
+    for index in range(target, limit):
+        line = lines[index]
+        if line and line[0] not in ' \t*' and not lines[index - 1].strip():
+            return index
+    return target
+
+
+def _init_worker(settings, language):
+    global _worker_settings, _worker_language
+    _worker_settings = settings
+    _worker_language = language
+
+
+def _format_chunk(text):
+    """在工作进程中格式化一块，假设它从注释之外、括号深度 0 开始
+
+    返回 (结果, 每行的缩进层数或 None, 块末的跨行状态, 深度变化)。
+    """
+    formatter = ChunkFormatter(_worker_settings, language=_worker_language)
+    if formatter.indent_unit is None:
+        formatted = '\n'.join(map(formatter.format_line, text.split('\n')))
+        # 不重新缩进时深度只在识别关键字参数的语言中变化
+        return formatted, None, formatter.in_comment, formatter.depth
+
+    parts = []
+    levels = array('q')
+    for line in text.split('\n'):
+        formatter.level = NO_INDENT
+        parts.append(formatter.format_line(line))
+        levels.append(formatter.level)
+    return '\n'.join(parts), levels, formatter.in_comment, formatter.depth
+
+
+def format_parallel(code, settings=None, jobs=None, cancel_event=None):
+    """并行格式化 code，结果与 format_engine.format 相同
+
+    jobs 缺省时等于 CPU 核心数；cancel_event 被设置时结束工作进程并返回 None。
+    """
+    if settings is None:
+        settings = format_engine.DEFAULT_SETTINGS
+    style = settings.get('style', 'standard')
+    jobs = jobs or os.cpu_count() or 1
+    lines = code.split('\n')
+    if (jobs == 1 or len(lines) < MIN_PARALLEL_LINES
+            or format_engine.compile_plan(settings).gap is None):
+        # 行数太少或未知风格
+        return format_engine.format(code, settings)
+
+    # 在父进程中识别一次语言，各块使用同一种语言
+    language = format_engine.resolve_language(settings, code)
+    ranges = split_chunks(lines, jobs * CHUNKS_PER_JOB)
+    indent_unit = format_engine.compile_plan(settings, style, language).indent_unit
+    pool = multiprocessing.Pool(min(jobs, len(ranges)), initializer=_init_worker,
+                                initargs=(settings, language))
+    try:
+        results = pool.imap(_format_chunk, ('\n'.join(lines[start:end]) for start, end in ranges))
+        parts = []
+        in_comment = False
+        depth = 0
+        for start, end in ranges:
+            while True:
+                if cancel_event is not None and cancel_event.is_set():
+                    return None
+                try:
+                    formatted, levels, end_in_comment, delta = results.next(POLL_INTERVAL)
+                    break
+                except multiprocessing.TimeoutError:
+                    pass
+
+            if in_comment or (levels is None and depth != 0):
+                # 切分点落在块注释或多行字符串中，或者落在关键字参数所在的括号中：
+                # 按实际状态重新格式化这一块
+                formatter = format_engine.LineFormatter(settings, style, language)
+                formatter.in_comment = in_comment
+                formatter.depth = depth
+                parts.append('\n'.join(map(formatter.format_line, lines[start:end])))
+                in_comment = formatter.in_comment
+                depth = formatter.depth
+                continue
+
+            if levels is not None and depth != 0:
+                formatted = _apply_levels(formatted, levels, depth, indent_unit)
+            parts.append(formatted)
+            in_comment = end_in_comment
+            depth += delta
+        pool.close()
+        return '\n'.join(parts)
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _apply_levels(formatted, levels, depth, indent_unit):
+    """把按深度 0 缩进的结果改为按块开头的实际深度缩进"""
+    width = len(indent_unit)
+    lines = formatted.split('\n')
+    for index, level in enumerate(levels):
+        if level != NO_INDENT:
+            lines[index] = indent_unit * max(0, depth + level) + lines[index][width * max(0, level):]
+    return '\n'.join(lines)
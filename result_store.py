@@ -0,0 +1,105 @@
+# result_store.py
+"""批量格式化的持久化结果缓存
+
+用 SQLite 记录“某个内容哈希在某个设置指纹下是否已经符合风格”，
+以及每个文件上次看到时的大小、修改时间和内容哈希。大小和修改时间都没变的文件不必重新读取，
+在没有改动的代码树上重复运行只需要几次 stat 和一次查询。
+"""
+import hashlib
+import os
+import sqlite3
+import time
+
+# 修改时间距今不到这么多纳秒的文件不记录 stat，避免同一时间片内的再次修改被漏掉
+RACY_WINDOW_NS = 2 * 1000 * 1000 * 1000
+
+
+def hash_file(path):
+    """文件内容的 blake2b 哈希"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_bytes(data):
+    """内存中的内容（例如暂存区中的版本）的哈希，与内容相同的文件的 hash_file 相同"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class ResultStore:
+    """以 (内容哈希, 设置指纹) 为键的格式化结果缓存"""
+
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript('''
+            CREATE TABLE IF NOT EXISTS results (
+                content_hash TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                clean INTEGER NOT NULL,
+                PRIMARY KEY (content_hash, fingerprint)
+            );
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                content_hash TEXT NOT NULL
+            );
+        ''')
+
+    def content_hash(self, path):
+        """返回文件内容哈希；大小和修改时间与上次相同时直接使用记录的哈希"""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        row = self._connection.execute(
+            'SELECT size, mtime_ns, content_hash FROM files WHERE path = ?', (path,)).fetchone()
+        if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+        content_hash = hash_file(path)
+        self._remember_stat(path, stat, content_hash)
+        return content_hash
+
+    def _remember_stat(self, path, stat, content_hash):
+        if time.time_ns() - stat.st_mtime_ns < RACY_WINDOW_NS:
+            self._connection.execute('DELETE FROM files WHERE path = ?', (path,))
+            return
+        self._connection.execute(
+            'INSERT OR REPLACE INTO files (path, size, mtime_ns, content_hash) VALUES (?, ?, ?, ?)',
+            (path, stat.st_size, stat.st_mtime_ns, content_hash))
+
+    def is_clean(self, content_hash, fingerprint):
+        """已知符合风格返回 True，已知需要修改返回 False，没有记录返回 None"""
+        row = self._connection.execute(
+            'SELECT clean FROM results WHERE content_hash = ? AND fingerprint = ?',
+            (content_hash, fingerprint)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return bool(row[0])
+
+    def put(self, content_hash, fingerprint, clean):
+        self._connection.execute(
+            'INSERT OR REPLACE INTO results (content_hash, fingerprint, clean) VALUES (?, ?, ?)',
+            (content_hash, fingerprint, int(clean)))
+
+    def mark_clean(self, path, fingerprint):
+        """格式化并写回后记录新内容，下次运行直接跳过"""
+        path = os.path.abspath(path)
+        content_hash = hash_file(path)
+        self._remember_stat(path, os.stat(path), content_hash)
+        self.put(content_hash, fingerprint, True)
+
+    def close(self):
+        self._connection.commit()
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
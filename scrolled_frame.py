@@ -0,0 +1,49 @@
+# scrolled_frame.py
+import tkinter as tk
+from tkinter import ttk
+
+
+class ScrolledFrame(tk.Frame):
+    """可滚动的Frame组件"""
+    def __init__(self, parent, *args, **kwargs):
+        super().__init__(parent, *args, **kwargs)
+        
+        # 创建Canvas和滚动条
+        self.canvas = tk.Canvas(self, borderwidth=0, highlightthickness=0)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.canvas.yview)
+        self.inner_frame = tk.Frame(self.canvas)
+        
+        # 配置Canvas
+        self.canvas.configure(yscrollcommand=self.scrollbar.set)
+        
+        # 绑定内部Frame的大小变化事件
+        self.inner_frame.bind(
+            "<Configure>",
+            lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all"))
+        )
+        
+        # 在Canvas中创建窗口
+        self.canvas_window = self.canvas.create_window((0, 0), window=self.inner_frame, anchor="nw")
+        
+        # 绑定Canvas大小变化事件
+        self.canvas.bind("<Configure>", self._on_canvas_configure)
+        
+        # 绑定鼠标滚轮事件
+        self._bind_mousewheel()
+        
+        # 布局
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+    
+    def _on_canvas_configure(self, event):
+        """当Canvas大小变化时，调整内部Frame的宽度"""
+        self.canvas.itemconfig(self.canvas_window, width=event.width)
+    
+    def _bind_mousewheel(self):
+        """绑定鼠标滚轮事件"""
+        def _on_mousewheel(event):
+            self.canvas.yview_scroll(int(-1 * (event.delta / 120)), "units")
+        
+        # 绑定到Canvas和内部Frame
+        self.canvas.bind("<MouseWheel>", _on_mousewheel)
+        self.inner_frame.bind("<MouseWheel>", _on_mousewheel)
@@ -0,0 +1,137 @@
+# spacing_rules.py
+r"""用户自定义的空白规则
+
+规则保存在设置文件旁边的 code_style_formatter_rules.json 中，例如：
+    {
+        "rules": [
+            {"name": "模板尖括号内不加空格", "pattern": "(\\w) < ([\\w:]+) >", "replace": "\\1<\\2>",
+             "languages": ["c"]},
+            {"name": "作用域运算符两侧不加空格", "pattern": " ?:: ?", "replace": "::", "enabled": false}
+        ]
+    }
+pattern 和 replace 与 re.sub 相同，只能使用编号分组；languages 缺省时对所有语言生效。
+规则在风格格式化之后作用于每行字符串、字符常量和注释之外的代码。
+
+所有启用的规则编译成一个带命名分组的正则，再用分组名查替换模板，
+无论有多少条规则，每行都只扫描一次。同一位置有多条规则能匹配时，文件中靠前的规则优先。
+"""
+import json
+import os
+import re
+
+RULES_FILE_NAME = 'code_style_formatter_rules.json'
+
+# 替换模板中的分组引用：\1 ~ \99 和 \g<数字>，其余转义原样保留
+_TEMPLATE_REF_RE = re.compile(r'\\(?:g<(\d+)>|([1-9]\d?)|.)', re.DOTALL)
+# 正则中的反向引用 \1 ~ \99
+_BACKREF_RE = re.compile(r'\\(?:([1-9]\d?)|.)', re.DOTALL)
+
+
+def rules_path(settings_path):
+    """设置文件旁边的规则文件路径"""
+    return os.path.join(os.path.dirname(os.path.abspath(settings_path)), RULES_FILE_NAME)
+
+
+def load_rules(path):
+    """读取规则文件，返回规则列表；文件不存在时返回空列表"""
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    rules = data.get('rules', []) if isinstance(data, dict) else data
+    if not isinstance(rules, list) or not all(isinstance(rule, dict) for rule in rules):
+        raise ValueError(f'{path} 中的 rules 必须是规则对象的列表')
+    return rules
+
+
+class RuleSet:
+    """编译好的规则：一个合并的正则和分组名到替换模板的分派表"""
+
+    def __init__(self, pattern, dispatch, names):
+        self.pattern = pattern
+        self.dispatch = dispatch
+        # 分组名 -> 规则名称，便于排查
+        self.names = names
+        self.search = pattern.search
+        self._sub = pattern.sub
+
+    def apply(self, text):
+        """对一段代码应用所有规则"""
+        return self._sub(self._replace, text)
+
+    def _replace(self, match):
+        return match.expand(self.dispatch[match.lastgroup])
+
+
+def compile_rules(rules, language=None):
+    """把启用且适用于 language 的规则编译成 RuleSet，没有这样的规则时返回 None
+
+    规则不合法时抛出 ValueError。
+    """
+    parts = []
+    dispatch = {}
+    names = {}
+    # 合并后的正则中，下一条规则外层分组的编号
+    group = 1
+    for index, rule in enumerate(rules or ()):
+        if not rule.get('enabled', True):
+            continue
+        languages = rule.get('languages')
+        if languages and language is not None and language not in languages:
+            continue
+        name = rule.get('name') or f'规则 {index + 1}'
+        pattern = rule.get('pattern')
+        replace = rule.get('replace', '')
+        if not isinstance(pattern, str) or not pattern or not isinstance(replace, str):
+            raise ValueError(f'{name}: pattern 和 replace 必须是字符串')
+        try:
+            compiled = re.compile(pattern)
+        except re.error as e:
+            raise ValueError(f'{name}: 正则无效: {e}')
+        if compiled.groupindex:
+            raise ValueError(f'{name}: 不能使用命名分组')
+        if compiled.fullmatch(''):
+            raise ValueError(f'{name}: 正则不能匹配空字符串')
+        try:
+            # 用分组个数相同的空正则展开一次，检查转义和分组引用
+            re.compile('()' * compiled.groups).sub(replace, '', count=1)
+        except (re.error, IndexError) as e:
+            # 引用不存在的分组名时 re 抛出 IndexError
+            raise ValueError(f'{name}: 替换模板无效: {e}')
+
+        key = f'rule{index}'
+        parts.append(f'(?P<{key}>{_shift_pattern(pattern, group)})')
+        dispatch[key] = _shift_template(replace, group)
+        names[key] = name
+        group += 1 + compiled.groups
+
+    if not parts:
+        return None
+    try:
+        combined = re.compile('|'.join(parts))
+    except re.error as e:
+        raise ValueError(f'规则无法合并: {e}')
+    return RuleSet(combined, dispatch, names)
+
+
+def _shift_pattern(pattern, group):
+    """规则正则中的反向引用同样要换成合并后的分组编号"""
+
+    def shift(match):
+        if match.group(1) is None:
+            return match.group()
+        return f'(?:\\{group + int(match.group(1))})'
+
+    return _BACKREF_RE.sub(shift, pattern)
+
+
+def _shift_template(replace, group):
+    r"""把规则自己的分组编号换成合并后正则中的编号；\g<0> 对应规则的外层分组"""
+
+    def shift(match):
+        number = match.group(1) or match.group(2)
+        if number is None:
+            return match.group()
+        return f'\\g<{group + int(number)}>'
+
+    return _TEMPLATE_REF_RE.sub(shift, replace)
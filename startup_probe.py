@@ -0,0 +1,88 @@
+# startup_probe.py
+"""测量启动耗时
+
+分别测量两项，每项运行多次取中位数：
+1. 无界面的格式化核心（format_engine 等）在新解释器中的导入耗时，任何平台都能测；
+2. 完整程序从开始导入到快捷键可用、托盘就绪的耗时（需要图形环境和全部依赖），
+   也可以用 --exe 测量打包后的程序。
+
+用法示例：
+    python startup_probe.py --runs 5
+    python startup_probe.py --exe dist/CodeStyleFormatter/CodeStyleFormatter.exe
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+_CORE_IMPORT = (
+    "import time; start = time.perf_counter(); "
+    "import format_engine, format_cache, format_worker, clipboard_backend; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def measure_core_import():
+    """返回 (导入耗时, 进程总耗时)"""
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', _CORE_IMPORT], cwd=HERE,
+                            capture_output=True, text=True, check=True).stdout
+    return float(output.strip()), time.perf_counter() - start
+
+
+def measure_app(command):
+    """运行带 --startup-probe=临时文件 参数的程序，返回 (各阶段耗时, 进程总耗时)
+
+    打包后的程序没有控制台，各阶段耗时由程序写入临时文件。
+    """
+    fd, path = tempfile.mkstemp(prefix='startup_probe_', suffix='.json')
+    os.close(fd)
+    try:
+        start = time.perf_counter()
+        # 启动失败时主函数会等待按键，不给它标准输入
+        result = subprocess.run(command + [f'--startup-probe={path}'], cwd=HERE,
+                                stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=60)
+        wall = time.perf_counter() - start
+        with open(path, 'r', encoding='utf-8') as f:
+            data = f.read()
+    finally:
+        os.remove(path)
+    if data:
+        return json.loads(data), wall
+    errors = [line for line in result.stderr.splitlines()
+              if 'Error' in line and not line.startswith('EOFError')]
+    raise RuntimeError(errors[-1] if errors else f'进程返回 {result.returncode}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='测量程序启动耗时')
+    parser.add_argument('--runs', type=int, default=5, help='每项运行次数')
+    parser.add_argument('--exe', help='测量打包后的可执行文件，而不是源码')
+    args = parser.parse_args(argv)
+
+    core = [measure_core_import() for _ in range(args.runs)]
+    print(f"格式化核心导入: {statistics.median(c[0] for c in core) * 1000:.1f} ms"
+          f"（进程总计 {statistics.median(c[1] for c in core) * 1000:.1f} ms）")
+
+    command = [args.exe] if args.exe else [sys.executable, 'code_style_formatter_fixed.py']
+    try:
+        runs = [measure_app(command) for _ in range(args.runs)]
+    except Exception as e:
+        print(f"完整程序无法在当前环境启动，跳过: {e}")
+        return 0
+
+    for stage in ('import', 'hotkey_ready', 'tray_ready'):
+        value = statistics.median(run[0][stage] for run in runs)
+        print(f"{stage:<13}{value * 1000:>9.1f} ms")
+    print(f"{'process':<13}{statistics.median(run[1] for run in runs) * 1000:>9.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+# test_clipboard_backend.py
+"""剪贴板等待和快捷键格式化流程的回归测试"""
+import sys
+import threading
+import time
+import types
+import unittest
+from unittest import mock
+
+import clipboard_backend
+import format_engine
+from clipboard_backend import MemoryClipboard
+from format_cache import FormatCache
+from format_metrics import LatencyStats
+
+try:
+    import code_style_formatter_fixed
+except ImportError:
+    # 没有 tkinter 的环境无法导入图形界面模块
+    code_style_formatter_fixed = None
+
+
+class FakeClock:
+    """用假的时钟代替 time.perf_counter 和 time.sleep，记录每次休眠的时长"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def perf_counter(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class CountingClipboard(MemoryClipboard):
+    """第 change_after 次读取标记时剪贴板才发生变化"""
+
+    def __init__(self, change_after=None):
+        super().__init__()
+        self.change_after = change_after
+        self.reads = 0
+
+    def change_marker(self):
+        self.reads += 1
+        if self.reads == self.change_after:
+            self.set_text('copied')
+        return super().change_marker()
+
+
+class WaitForChangeTest(unittest.TestCase):
+
+    def fake_clock(self):
+        clock = FakeClock()
+        patcher = mock.patch.multiple(clipboard_backend.time, perf_counter=clock.perf_counter,
+                                      sleep=clock.sleep)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return clock
+
+    def test_returns_when_clipboard_changes(self):
+        clipboard = MemoryClipboard('old')
+        marker = clipboard.change_marker()
+        timer = threading.Timer(0.02, clipboard.set_text, ['new'])
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+        start = time.perf_counter()
+        self.assertTrue(clipboard_backend.wait_for_change(clipboard, marker, timeout=2.0))
+        self.assertLess(time.perf_counter() - start, 1.0)
+
+    def test_already_changed_does_not_sleep(self):
+        clock = self.fake_clock()
+        clipboard = MemoryClipboard()
+        marker = clipboard.change_marker()
+        clipboard.set_text('new')
+        self.assertTrue(clipboard_backend.wait_for_change(clipboard, marker))
+        self.assertEqual(clock.sleeps, [])
+
+    def test_timeout(self):
+        clock = self.fake_clock()
+        clipboard = MemoryClipboard()
+        marker = clipboard.change_marker()
+        self.assertFalse(clipboard_backend.wait_for_change(clipboard, marker, timeout=0.3))
+        self.assertAlmostEqual(sum(clock.sleeps), 0.3)
+
+    def test_backoff_doubles_up_to_max_interval(self):
+        clock = self.fake_clock()
+        clipboard = CountingClipboard(change_after=8)
+        marker = clipboard.sequence_number()
+        self.assertTrue(clipboard_backend.wait_for_change(
+            clipboard, marker, timeout=1.0, interval=0.005, max_interval=0.05))
+        expected = [0.005, 0.01, 0.02, 0.04, 0.05, 0.05, 0.05]
+        self.assertEqual(len(clock.sleeps), len(expected))
+        for slept, interval in zip(clock.sleeps, expected):
+            self.assertAlmostEqual(slept, interval)
+
+    def test_last_sleep_is_cut_to_deadline(self):
+        clock = self.fake_clock()
+        clipboard = MemoryClipboard()
+        self.assertFalse(clipboard_backend.wait_for_change(
+            clipboard, clipboard.sequence_number(), timeout=0.02, interval=0.015))
+        self.assertAlmostEqual(clock.sleeps[0], 0.015)
+        self.assertAlmostEqual(clock.sleeps[1], 0.005)
+
+
+class FakeKeyboard(types.ModuleType):
+    """代替 keyboard 模块：记录发送的按键，Ctrl+C 时把“选中的文本”写入剪贴板"""
+
+    def __init__(self, clipboard, selection):
+        super().__init__('keyboard')
+        self.clipboard = clipboard
+        self.selection = selection
+        self.sent = []
+        self.pasted = None
+
+    def send(self, keys):
+        self.sent.append(keys)
+        if keys == 'ctrl+c' and self.selection is not None:
+            self.clipboard.set_text(self.selection)
+        elif keys == 'ctrl+v':
+            self.pasted = self.clipboard.get_text()
+
+
+@unittest.skipIf(code_style_formatter_fixed is None, '需要 tkinter')
+class FormatSelectedCodeTest(unittest.TestCase):
+
+    def run_format(self, selection, original='original'):
+        app = code_style_formatter_fixed.CodeStyleFormatter.__new__(
+            code_style_formatter_fixed.CodeStyleFormatter)
+        app.settings = dict(format_engine.DEFAULT_SETTINGS, paste_delay=0, copy_timeout=0.05)
+        app.clipboard = MemoryClipboard(original)
+        app.format_cache = FormatCache()
+        app.latency = LatencyStats()
+        keyboard = FakeKeyboard(app.clipboard, selection)
+        with mock.patch.dict(sys.modules, keyboard=keyboard):
+            app.format_selected_code()
+        return app, keyboard
+
+    def test_selection_is_formatted_and_clipboard_restored(self):
+        app, keyboard = self.run_format('int a=b+c;')
+        self.assertEqual(keyboard.sent, ['ctrl+c', 'ctrl+v'])
+        self.assertEqual(keyboard.pasted, 'int a = b + c;')
+        self.assertEqual(app.clipboard.get_text(), 'original')
+        self.assertEqual(app.latency.outcomes, {'ok': 1})
+
+    def test_nothing_selected_does_not_paste(self):
+        app, keyboard = self.run_format(None)
+        self.assertEqual(keyboard.sent, ['ctrl+c'])
+        self.assertEqual(app.clipboard.get_text(), 'original')
+        self.assertEqual(app.latency.outcomes, {'empty': 1})
+
+    def test_formatted_selection_is_not_pasted(self):
+        app, keyboard = self.run_format('int a = b + c;')
+        self.assertEqual(keyboard.sent, ['ctrl+c'])
+        self.assertEqual(app.clipboard.get_text(), 'original')
+        self.assertEqual(app.latency.outcomes, {'unchanged': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
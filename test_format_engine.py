@@ -0,0 +1,181 @@
+# test_format_engine.py
+"""词法分析器和格式化引擎的回归测试"""
+import unittest
+
+import code_lexer
+import format_engine
+from code_lexer import Token
+
+
+def fmt(code):
+    return format_engine.format(code, format_engine.DEFAULT_SETTINGS)
+
+
+class LexerTest(unittest.TestCase):
+
+    def test_member_access_is_punctuation(self):
+        tokens, _ = code_lexer.tokenize_line('a.b->c')
+        self.assertEqual([t.text for t in tokens], ['a', '.', 'b', '->', 'c'])
+        self.assertEqual(tokens[1].kind, code_lexer.PUNCTUATION)
+
+    def test_number_followed_by_dot_needs_separator(self):
+        number = Token(code_lexer.NUMBER, '1')
+        self.assertTrue(code_lexer.needs_separator(number, Token(code_lexer.PUNCTUATION, '.')))
+        self.assertFalse(code_lexer.needs_separator(
+            Token(code_lexer.IDENTIFIER, 'a'), Token(code_lexer.PUNCTUATION, '.')))
+
+    def test_block_comment_carries_over(self):
+        tokens, state = code_lexer.tokenize_line('a /* b')
+        self.assertEqual(tokens[-1], Token(code_lexer.COMMENT, '/* b'))
+        self.assertEqual(state, '*/')
+
+        tokens, state = code_lexer.tokenize_line('still comment', state)
+        self.assertEqual(tokens, [Token(code_lexer.COMMENT, 'still comment')])
+        self.assertEqual(state, '*/')
+
+        tokens, state = code_lexer.tokenize_line('c */ d', state)
+        self.assertEqual(tokens[0], Token(code_lexer.COMMENT, 'c */'))
+        self.assertEqual(tokens[-1], Token(code_lexer.IDENTIFIER, 'd'))
+        self.assertIs(state, False)
+
+    def test_literal_spans_carry_over(self):
+        spans, state = code_lexer.literal_spans('x = "a"; /* b')
+        self.assertEqual(spans, [(4, 7), (9, 13)])
+        spans, state = code_lexer.literal_spans('c */ y', state)
+        self.assertEqual(spans, [(0, 4)])
+        self.assertIs(state, False)
+
+
+class FormatTest(unittest.TestCase):
+
+    def test_member_access_stays_tight(self):
+        self.assertEqual(fmt('a.b=c->d.e;'), 'a.b = c->d.e;')
+
+    def test_unary_and_binary_operators(self):
+        self.assertEqual(fmt('x=-y;'), 'x = -y;')
+        self.assertEqual(fmt('z=a-b;'), 'z = a - b;')
+        self.assertEqual(fmt('r=*p*q;'), 'r = *p * q;')
+        self.assertEqual(fmt('f(-1,!ok);'), 'f (-1, !ok);')
+        self.assertEqual(fmt('return -x;'), 'return -x;')
+
+    def test_number_and_member_access_stay_separated(self):
+        self.assertEqual(fmt('y=1 .x;'), 'y = 1 .x;')
+        self.assertEqual(fmt('x=1.5+.5e-3;'), 'x = 1.5 + .5e-3;')
+
+    def test_crlf_line_endings_are_kept(self):
+        self.assertEqual(fmt('a=b;\r\nc=d;\r\n'), 'a = b;\r\nc = d;\r\n')
+        self.assertEqual(format_engine.format_bytes(b'a=b;\r\nc=d;\r\n'), b'a = b;\r\nc = d;\r\n')
+
+    def test_block_comment_across_lines_is_unchanged(self):
+        code = 'a=b;/* x=y\n z=w\n */c=d;'
+        self.assertEqual(fmt(code), 'a = b;/* x=y\n z=w\n */c = d;')
+
+    def test_string_contents_are_unchanged(self):
+        self.assertEqual(fmt('s="a=b,c";'), 's = "a=b,c";')
+
+
+class WhitespaceStripperTest(unittest.TestCase):
+    """简洁风格不切分记号的整行改写必须与记号流上的结果相同"""
+
+    CASES = {
+        'c': ['int a = b + c ;  ', 'x = a - -b; y = a- - b;', 'f ( a , b ) ;// c  ',
+              'p = q / *r; /* c */ = d', 's = "a , b" + t ;', '} ) ] x', 'n = 1 .x + 2'],
+        'javascript': ['x = a / b / c;', 'r = /ab+c/g , y', 'w = a / /re/.exec(b)',
+                       'z = /re/ / 2 ;', '$ (x) , f ("s")', 'q = a ?. b ?? c'],
+        'python': ['x = f(a = 1, b = -2)  # c', 'def f(a : int = 1):', 's = """a """ + b'],
+    }
+
+    def check(self, settings):
+        for language, lines in self.CASES.items():
+            settings = dict(settings, language=language, use_indentation=False)
+            for line in lines:
+                results = []
+                for rewrite in (True, False):
+                    formatter = format_engine.LineFormatter(settings)
+                    formatter.memo = format_engine.LineMemo()
+                    if not rewrite:
+                        formatter.rewrite = None
+                    results.append((formatter.format_line(line), formatter.in_comment,
+                                    formatter.depth))
+                self.assertEqual(results[0], results[1], (language, line))
+
+    def test_concise_matches_tokens(self):
+        self.check(dict(format_engine.DEFAULT_SETTINGS, style='concise'))
+
+    def test_custom_without_operator_spaces_matches_tokens(self):
+        for comma in (True, False):
+            for parentheses in (True, False):
+                self.check(dict(format_engine.DEFAULT_SETTINGS, style='custom',
+                                space_around_operators=False, space_after_comma=comma,
+                                space_before_parentheses=parentheses))
+
+    def test_concise_output(self):
+        settings = dict(format_engine.DEFAULT_SETTINGS, style='concise')
+        self.assertEqual(format_engine.format('x = a - -b ;  // c', settings), 'x=a- -b;  // c')
+        self.assertEqual(format_engine.format('z = /re/ / 2', dict(settings, language='javascript')),
+                         'z=/re/ /2')
+
+
+class LineMemoTest(unittest.TestCase):
+
+    def test_memory_bound(self):
+        memo = format_engine.LineMemo(max_size=1000, max_bytes=3000, max_line=100)
+        for index in range(100):
+            line = f'x{index:03d}' * 20
+            memo.put((line, False), (line, False, 0, 0))
+        # 每项约 80 + 80 个字符加上固定开销，3000 字节只够放几项
+        self.assertLess(len(memo._entries), 10)
+        self.assertLessEqual(memo._size, memo.max_bytes)
+        self.assertIsNotNone(memo.get((line, False)))
+
+    def test_long_lines_are_not_cached(self):
+        memo = format_engine.LineMemo(max_line=10)
+        memo.put(('a' * 11, False), ('a' * 11, False, 0, 0))
+        self.assertIsNone(memo.get(('a' * 11, False)))
+
+    def test_clear_resets_size(self):
+        memo = format_engine.LineMemo()
+        memo.put(('a=b;', False), ('a = b;', False, 0, 0))
+        memo.clear()
+        self.assertEqual(memo._size, 0)
+
+
+class FingerprintTest(unittest.TestCase):
+
+    def test_format_version_changes_fingerprint(self):
+        settings = format_engine.DEFAULT_SETTINGS
+        before = format_engine.settings_fingerprint(settings)
+        version = format_engine.FORMAT_VERSION
+        format_engine.FORMAT_VERSION = version + 1
+        try:
+            self.assertNotEqual(format_engine.settings_fingerprint(settings), before)
+        finally:
+            format_engine.FORMAT_VERSION = version
+        self.assertEqual(format_engine.settings_fingerprint(settings), before)
+
+
+class LanguageTest(unittest.TestCase):
+
+    def fmt(self, code, language):
+        return format_engine.format(code, dict(format_engine.DEFAULT_SETTINGS, language=language))
+
+    def test_javascript_regex_literals_are_unchanged(self):
+        self.assertEqual(self.fmt("s.replace(/\\s+/g,'')", 'javascript'), "s.replace (/\\s+/g, '')")
+        self.assertEqual(self.fmt('const re=/=>|\\/\\//;', 'javascript'), 'const re = /=>|\\/\\//;')
+        self.assertEqual(self.fmt('ok=/^a[/]b$/i.test(s);', 'javascript'), 'ok = /^a[/]b$/i.test (s);')
+
+    def test_javascript_division_is_an_operator(self):
+        self.assertEqual(self.fmt('x=a/b/c;', 'javascript'), 'x = a / b / c;')
+        self.assertEqual(self.fmt('y=(a)/2/(b);', 'javascript'), 'y = (a) / 2 / (b);')
+
+    def test_python_keyword_arguments_stay_tight(self):
+        self.assertEqual(self.fmt('x=f(a=1,b=-2)', 'python'), 'x = f (a=1, b=-2)')
+        self.assertEqual(self.fmt('d=dict(\n    a=1,\n)\ne=3', 'python'),
+                         'd = dict (\n    a=1,\n)\ne = 3')
+
+    def test_python_annotated_defaults_keep_spaces(self):
+        self.assertEqual(self.fmt('def f(a: int=1, b=2):', 'python'), 'def f (a: int = 1, b=2):')
+
+
+if __name__ == '__main__':
+    unittest.main()
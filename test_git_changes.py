@@ -0,0 +1,95 @@
+# test_git_changes.py
+"""git 模式下改动文件和改动行的回归测试"""
+import contextlib
+import io
+import os
+import shutil
+import stat
+import subprocess
+import tempfile
+import unittest
+
+import batch_format
+import git_changes
+
+
+@unittest.skipUnless(shutil.which('git'), '需要 git')
+class StagedChangesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = os.path.realpath(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root, True)
+        self.git('init', '-q')
+        self.git('config', 'user.email', 'test@example.com')
+        self.git('config', 'user.name', 'test')
+        # 用户配置不应影响 diff 的解析
+        self.git('config', 'diff.noprefix', 'true')
+        os.makedirs(os.path.join(self.root, 'src'))
+        self.write('src/m.c', 'int a = 1;\n')
+        self.write('src/x.c', 'int c = 1;\n')
+        self.write('src/s p.c', 'int b = 1;\n')
+        self.git('add', '.')
+        self.git('commit', '-q', '-m', 'init')
+
+    def git(self, *args):
+        subprocess.run(['git'] + list(args), cwd=self.root, check=True, capture_output=True)
+
+    def write(self, name, text):
+        with open(os.path.join(self.root, name), 'w', newline='') as f:
+            f.write(text)
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def test_rename_and_mode_change_have_no_changed_lines(self):
+        self.git('mv', 'src/m.c', 'src/n.c')
+        path = self.path('src/x.c')
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+        self.git('add', 'src/x.c')
+
+        ranges = git_changes.changed_lines(staged=True, cwd=self.root)
+        self.assertEqual(ranges, {self.path('src/n.c'): [], self.path('src/x.c'): []})
+
+    def test_path_with_space(self):
+        self.write('src/s p.c', 'int b = 1;\nint d=2;\n')
+        self.git('add', '.')
+        ranges = git_changes.changed_lines(staged=True, cwd=self.root)
+        self.assertEqual(ranges, {self.path('src/s p.c'): [(2, 2)]})
+
+    def test_untracked_file_is_whole_file(self):
+        self.write('src/new.c', 'int e=1;\n')
+        ranges = git_changes.changed_lines(cwd=self.root)
+        self.assertIsNone(ranges[self.path('src/new.c')])
+
+    def test_staged_check_ignores_pure_rename(self):
+        # 改名前的内容不符合风格，但没有改动的行
+        self.write('src/m.c', 'int a=1;\n')
+        self.git('commit', '-q', '-am', 'unformatted')
+        self.git('mv', 'src/m.c', 'src/n.c')
+
+        cwd = os.getcwd()
+        os.chdir(self.root)
+        self.addCleanup(os.chdir, cwd)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            code = batch_format.main(['--staged', '--changed-lines', '--check', '--no-cache'])
+        self.assertEqual(code, 0, output.getvalue())
+        self.assertNotIn('需要格式化', output.getvalue())
+
+    def test_staged_check_uses_index_content(self):
+        self.write('src/x.c', 'int c=2;\n')
+        self.git('add', 'src/x.c')
+        self.write('src/x.c', 'int c = 2;\n')
+
+        cwd = os.getcwd()
+        os.chdir(self.root)
+        self.addCleanup(os.chdir, cwd)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            code = batch_format.main(['--staged', '--check', '--no-cache'])
+        self.assertEqual(code, 1)
+        self.assertIn(self.path('src/x.c'), output.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
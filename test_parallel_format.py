@@ -0,0 +1,70 @@
+# test_parallel_format.py
+"""并行格式化必须与顺序格式化逐字节相同，切分点落在跨行结构中间时也一样"""
+import unittest
+from unittest import mock
+
+import format_engine
+import parallel_format
+
+STYLES = [
+    {'style': 'standard'},
+    {'style': 'concise'},
+    {'style': 'custom', 'space_around_operators': False, 'space_after_comma': True,
+     'space_before_parentheses': False},
+]
+
+
+def repeat(head, body, tail, count=3, body_lines=60):
+    return '\n'.join([head + '\n' + body * body_lines + tail] * count)
+
+
+class FormatParallelTest(unittest.TestCase):
+
+    def setUp(self):
+        # 调小阈值，几百行的代码也会切成多块
+        patcher = mock.patch.multiple(parallel_format, MIN_PARALLEL_LINES=50,
+                                      MIN_CHUNK_LINES=10, BOUNDARY_WINDOW=5)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def check(self, code, settings, force_cut=True):
+        lines = code.split('\n')
+        if force_cut:
+            # 不找空行之后的边界，直接在目标行切分，切分点落在结构中间
+            patcher = mock.patch.object(parallel_format, '_find_boundary',
+                                        lambda lines, target, limit: target)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.assertGreater(len(parallel_format.split_chunks(lines, 8)), 2)
+        for style in STYLES:
+            current = dict(format_engine.DEFAULT_SETTINGS, **settings, **style)
+            with self.subTest(style=style['style']):
+                self.assertEqual(parallel_format.format_parallel(code, current, jobs=2),
+                                 format_engine.format(code, current))
+
+    def test_cut_inside_block_comment(self):
+        code = repeat('int a=1;\n/* comment', 'x=1, y=f(a)+2;\n', '*/\nint b=2;')
+        self.check(code, {'language': 'c'})
+        self.check(code, {'language': 'c', 'use_indentation': False})
+
+    def test_cut_inside_python_triple_quoted_string(self):
+        code = repeat('x=1\ns = """doc', 'a=b, c=d(e)\n', '"""\ny=2')
+        self.check(code, {'language': 'python'})
+
+    def test_cut_inside_open_bracket_when_reindenting(self):
+        code = repeat('void f(){\nint a[]={', '1+2, g (x),\n', '};\n}')
+        self.check(code, {'language': 'c', 'use_indentation': False, 'indent_size': 2})
+
+    def test_cut_inside_python_call_arguments(self):
+        # 括号内的 = 是关键字参数，块开头的深度不为 0 时必须按实际深度重新格式化
+        code = repeat('result=f(', 'a=1, b=-2,\n', ')\nz=3')
+        self.check(code, {'language': 'python', 'use_indentation': False})
+
+    def test_default_boundaries(self):
+        code = '\n\n'.join(repeat('int a=1;\n/* c', 'x=1;\n', '*/', count=1, body_lines=3)
+                           for _ in range(40))
+        self.check(code, {'language': 'c', 'use_indentation': False}, force_cut=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
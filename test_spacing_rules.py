@@ -0,0 +1,82 @@
+# test_spacing_rules.py
+"""自定义空白规则合并成一个正则后分组编号的回归测试"""
+import unittest
+
+import format_engine
+import spacing_rules
+
+
+def rule(pattern, replace, **extra):
+    return dict(extra, pattern=pattern, replace=replace)
+
+
+class CompileRulesTest(unittest.TestCase):
+
+    def apply(self, rules, text, language=None):
+        return spacing_rules.compile_rules(rules, language).apply(text)
+
+    def test_two_rules_using_first_group(self):
+        rules = [rule(r'(\w) < (\w+) >', r'\1<\2>'), rule(r'(\w+) ::', r'\1::')]
+        self.assertEqual(self.apply(rules, 'vector < int > v; std :: move'),
+                         'vector<int> v; std:: move')
+
+    def test_backreference_inside_pattern(self):
+        # 第二条规则的 \1 指向它自己的分组，而不是合并后正则的第 1 组
+        rules = [rule(r'(\w+) ->', r'\1->'), rule(r'(\w+) = \1\b', r'\1 *= 2')]
+        self.assertEqual(self.apply(rules, 'p -> x; n = n; n = m'), 'p-> x; n *= 2; n = m')
+
+    def test_escaped_backslash_is_not_a_backreference(self):
+        rules = [rule(r'(x)', r'\1'), rule(r'a\\1', r'b')]
+        self.assertEqual(self.apply(rules, r'a\1 x'), r'b x')
+
+    def test_whole_match_reference(self):
+        rules = [rule(r'(\w) ,', r'\1,'), rule(r'\w+ \(', r'[\g<0>]')]
+        self.assertEqual(self.apply(rules, 'f (a , b)'), '[f (]a, b)')
+
+    def test_numbered_g_reference(self):
+        rules = [rule(r'(a)(b)', r'\2\1'), rule(r'(c)(d)', r'\g<2>\g<1>')]
+        self.assertEqual(self.apply(rules, 'ab cd'), 'ba dc')
+
+    def test_earlier_rule_wins(self):
+        rules = [rule(r'a b', 'first'), rule(r'a', 'second')]
+        self.assertEqual(self.apply(rules, 'a b a'), 'first second')
+
+    def test_disabled_and_other_language_rules_are_skipped(self):
+        rules = [rule('a', 'x', enabled=False), rule('b', 'y', languages=['python'])]
+        self.assertIsNone(spacing_rules.compile_rules(rules, 'c'))
+        self.assertEqual(self.apply(rules, 'ab', 'python'), 'ay')
+
+    def test_rules_apply_outside_literals(self):
+        settings = dict(format_engine.DEFAULT_SETTINGS,
+                        custom_rules=[rule(r'(\w) < (\w+) >', r'\1<\2>')])
+        self.assertEqual(format_engine.format('f(vector<int>x,"a<b>c");', settings),
+                         'f (vector<int> x, "a<b>c");')
+
+
+class InvalidRuleTest(unittest.TestCase):
+
+    def assertInvalid(self, rules, message):
+        with self.assertRaises(ValueError) as context:
+            spacing_rules.compile_rules(rules)
+        self.assertIn(message, str(context.exception))
+
+    def test_pattern_must_be_string(self):
+        self.assertInvalid([rule(None, 'x', name='坏规则')], '坏规则: pattern 和 replace 必须是字符串')
+        self.assertInvalid([rule('a', 1)], '规则 1: pattern 和 replace 必须是字符串')
+
+    def test_invalid_pattern(self):
+        self.assertInvalid([rule('a', 'b'), rule('(a', 'b')], '规则 2: 正则无效')
+
+    def test_named_group(self):
+        self.assertInvalid([rule('(?P<x>a)', 'b')], '规则 1: 不能使用命名分组')
+
+    def test_empty_match(self):
+        self.assertInvalid([rule('a*', 'b')], '规则 1: 正则不能匹配空字符串')
+
+    def test_invalid_template(self):
+        self.assertInvalid([rule('(a)', r'\2')], '规则 1: 替换模板无效')
+        self.assertInvalid([rule('a', r'\g<x>')], '规则 1: 替换模板无效')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,16 @@
+# tray_icon_data.py
+"""预先生成的默认托盘图标（64x64 PNG，深蓝底白色 C），启动时无需绘制或下载"""
+import base64
+
+ICON_PNG_BASE64 = (
+    'iVBORw0KGgoAAAANSUhEUgAAAEAAAABACAYAAACqaXHeAAAAuUlEQVR42u3a0Q2AIAwFQCdxEEd0'
+    'aV3BRFpKuZfwr4dBKD3O6352HgcAAAAAAAAAAAAAAPHja1oB/M2yAKOzDEB0SgNkpSRAdkoBzEoJ'
+    'gNmZChDxwMt8AdEzVX4NyJqlkn+B7JU6cjMUBtD2MNTp5QFEALSuB3Sb/eEA7StCAAAAAAAAAIB9'
+    'N0Lbb4UdhgAoiCiJKYoqi7sYcTXmctT1uAYJLTKapLTJaZTUKgsAAAAAAAAAAABg4fECsf+MTMlE'
+    'Ax0AAAAASUVORK5CYII='
+)
+
+
+def icon_png_bytes():
+    """返回默认图标的 PNG 数据"""
+    return base64.b64decode(ICON_PNG_BASE64)